@@ -0,0 +1,66 @@
+"""
+Stress run for the shared metadata cache.
+
+Spawns many writer processes against one CacheStore file, each writing its own keys
+plus a set of keys shared by every worker, then checks that no entry was lost.
+
+    poetry run python benchmarks/cache_stress.py --workers 16 --entries 500
+"""
+import argparse
+import multiprocessing
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from vinetrimmer.utils.cache_store import CacheStore
+
+
+def writer(path, worker, entries, shared):
+    store = CacheStore(path, ttl=3600, compact_interval=0)
+    for i in range(entries):
+        store.set(f"{worker}:{i}", {"worker": worker, "i": i, "data": "x" * 256})
+        if i % 10 == 0:
+            store.get(f"shared:{i % shared}")
+            store.set(f"shared:{i % shared}", {"worker": worker})
+    store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--entries", type=int, default=500)
+    parser.add_argument("--shared", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "stress.db"
+        CacheStore(path, compact_interval=0).close()
+
+        start = time.perf_counter()
+        procs = [
+            multiprocessing.Process(target=writer, args=(path, n, args.entries, args.shared))
+            for n in range(args.workers)
+        ]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join()
+        elapsed = time.perf_counter() - start
+
+        store = CacheStore(path, compact_interval=0)
+        missing = [
+            f"{n}:{i}" for n in range(args.workers) for i in range(args.entries)
+            if store.get(f"{n}:{i}") is None
+        ]
+        failed = [proc.exitcode for proc in procs if proc.exitcode]
+        total = args.workers * args.entries
+        print(f"{args.workers} writers, {total} entries in {elapsed:.2f}s ({total / elapsed:.0f} writes/s)")
+        print(f"entries in store: {len(store)}, missing: {len(missing)}, failed writers: {len(failed)}")
+        store.close()
+
+    return 1 if missing or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
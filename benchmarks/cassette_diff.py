@@ -0,0 +1,77 @@
+"""
+Compare the HTTP traffic of two runs, per endpoint.
+
+Each input is either a cassette (VT_CASSETTE with VT_CASSETTE_MODE=record) or a
+metrics report (VT_METRICS ending in .json), e.g. a recording of the old build
+against a replay of the same cassette by the new one:
+
+    VT_CASSETTE=run.cassette VT_CASSETTE_MODE=record VT_METRICS=old.json poetry run vt dl ...
+    VT_CASSETTE=run.cassette VT_METRICS=new.json poetry run vt dl ...
+    poetry run python benchmarks/cassette_diff.py old.json new.json
+"""
+import argparse
+import gzip
+import json
+import statistics
+import sys
+from collections import defaultdict
+from urllib.parse import urlsplit, urlunsplit
+
+from vinetrimmer.utils.http_metrics import endpoint_template
+
+
+def load(path):
+    """{endpoint: (request count, p50 seconds, total seconds)} of a cassette or metrics report."""
+    with open(path, "rb") as f:
+        gzipped = f.read(2) == b"\x1f\x8b"
+    if not gzipped:
+        with open(path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+        return {
+            name: (x["count"], x["latency"]["p50"], x["latency"]["sum"])
+            for name, x in report["endpoints"].items()
+        }
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        cassette = json.load(f)
+    samples = defaultdict(list)
+    for entry in cassette["interactions"]:
+        method, url = entry["request"].split(" ", 1)
+        parts = urlsplit(url)
+        samples[endpoint_template(method, urlunsplit((parts.scheme, parts.netloc, parts.path, "", "")))].append(
+            entry["elapsed"]
+        )
+    return {name: (len(x), statistics.median(x), sum(x)) for name, x in samples.items()}
+
+
+def ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("old")
+    parser.add_argument("new")
+    args = parser.parse_args()
+
+    old, new = load(args.old), load(args.new)
+    empty = (0, None, 0.0)
+    rows = [
+        (name, old.get(name, empty), new.get(name, empty))
+        for name in sorted(set(old) | set(new))
+    ]
+    width = max([len(name) for name, _, _ in rows] + [8])
+    print(f"{'endpoint':<{width}}  {'requests':>17}  {'p50 ms':>17}  {'total ms':>19}")
+    for name, (a_count, a_p50, a_sum), (b_count, b_p50, b_sum) in rows:
+        print(
+            f"{name:<{width}}  {a_count:>5} → {b_count:<5} {b_count - a_count:+4}  "
+            f"{ms(a_p50):>7} → {ms(b_p50):<7}  {ms(a_sum):>8} → {ms(b_sum):<8}"
+        )
+    a_total = sum(x[0] for x in old.values())
+    b_total = sum(x[0] for x in new.values())
+    print(f"{'total':<{width}}  {a_total:>5} → {b_total:<5} {b_total - a_total:+4}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""
+Cold start benchmark for the service registry.
+
+Times fresh interpreters that dispatch a URL through the lazy registry (importing only
+the matching service) against interpreters that eagerly import every service.
+
+    poetry run python benchmarks/cold_start.py --runs 20
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+URL = "https://play.mercadolivre.com.br/assistir/piloto/a61052a39bc44bdf8854b2cc3d1668a8"
+
+CASES = {
+    "interpreter": "pass",
+    "eager": (
+        "from vinetrimmer.services.f1tv import F1tv\n"
+        "from vinetrimmer.services.globoplay import Globoplay\n"
+        "from vinetrimmer.services.meliplay import Meliplay\n"
+    ),
+    "lazy": (
+        "from vinetrimmer.services.registry import load_service, match_title\n"
+        f"name, _ = match_title({URL!r})\n"
+        "load_service(name)\n"
+    ),
+    "lazy-dispatch-only": (
+        "from vinetrimmer.services.registry import get_service_key\n"
+        f"get_service_key({URL!r})\n"
+    ),
+}
+
+
+def run(code, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    for case, code in CASES.items():
+        timings = run(code, args.runs)
+        print(
+            f"{case:<20} median {statistics.median(timings):7.1f} ms"
+            f"  min {min(timings):7.1f} ms  max {max(timings):7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Offline benchmark of the services' get_titles/get_tracks against the local stand-in.
+
+Each service resolves the whole synthetic catalog (Meli Play with -as, Globoplay with
+-as, F1TV through an event page), then builds the tracks of every title with
+`--concurrency` workers. Caches are moved to a temporary folder: `cold` starts every
+iteration from empty caches, `warm` runs one untimed pass first and keeps them.
+
+    poetry run python benchmarks/service_bench.py --episodes 200 --seasons 5 --latency 0.02
+    poetry run python benchmarks/service_bench.py --service MELI --temperature warm --error-rate 0.05
+"""
+import argparse
+import json
+import logging
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+import click
+from requests.cookies import cookiejar_from_dict
+
+from standin import Catalog, StandIn
+from vinetrimmer.services.registry import load_service
+from vinetrimmer.utils import http_cache, manifests, ratelimit
+
+SERVICES = {
+    "MELI": ("Meliplay", "-as"),
+    "GLOBO": ("Globoplay", "-as"),
+    "F1TV": ("F1tv", None),
+}
+
+COOKIES = {"GLBID": "benchmark", "entitlement_token": "benchmark"}
+
+
+def title_url(name, catalog):
+    if name == "Meliplay":
+        return f"https://play.mercadolivre.com.br/assistir/benchmark/{catalog.meli_ids[0]}"
+    if name == "Globoplay":
+        return f"https://globoplay.globo.com/v/{Catalog.GLOBO_FIRST_VIDEO}/"
+    return f"https://f1tv.formula1.com/page/{Catalog.F1_EVENT}/benchmark"
+
+
+def local_endpoints(endpoints, base):
+    """Point every endpoint at the stand-in, keeping path and query templates."""
+    if isinstance(endpoints, dict):
+        return {k: local_endpoints(v, base) for k, v in endpoints.items()}
+    parts = urlsplit(endpoints)
+    return base + endpoints[len(f"{parts.scheme}://{parts.netloc}"):]
+
+
+def patch_service(cls, base, args):
+    """Make the service read its endpoints from the stand-in, without rate limits unless `--rate-limit`."""
+    module = sys.modules[cls.__module__]
+    load_config = module.load_service_config
+
+    def load_local_config(name, *a, **kw):
+        config = load_config(name, *a, **kw)
+        config["endpoints"] = local_endpoints(config["endpoints"], base)
+        config["concurrency"] = args.concurrency
+        if not args.rate_limit:
+            config["rate_limit"] = {"rate": 1e9, "burst": 1e9, "max_concurrency": 1024}
+        return config
+
+    module.load_service_config = load_local_config
+
+
+def reset_caches(cls, cache_dir):
+    stores = list(http_cache._stores.values()) + list(getattr(cls, "cache_shards", {}).values())
+    if getattr(cls, "feed_cache", None):
+        stores.append(cls.feed_cache)
+    for store in stores + ([manifests._store] if manifests._store else []):
+        store.close()
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    manifests.CACHE_FILE = cache_dir / "manifests.db"
+    manifests._store = None
+    http_cache.CACHE_DIR = cache_dir / "http"
+    http_cache._stores.clear()
+    ratelimit._hosts.clear()
+    if hasattr(cls, "cache_shards"):
+        cls.CACHE_DIR = cache_dir / "MELI"
+        cls.cache_shards.clear()
+    if hasattr(cls, "CACHE_FILE") and isinstance(cls.CACHE_FILE, Path):
+        cls.CACHE_FILE = cache_dir / "F1TV" / "playback.db"
+        cls.feed_cache = None
+
+
+def make_service(cls, url, flag):
+    parent = click.Context(click.Command("dl"))
+    parent.params = defaultdict(lambda: None, {"no_proxy": True, "quality": 1080})
+    obj = SimpleNamespace(
+        config={}, credentials=None, profile="benchmark", vaults=None,
+        cdm=SimpleNamespace(), cookies=cookiejar_from_dict(COOKIES)
+    )
+    args = [url] + ([flag] if flag else [])
+    ctx = cls.cli.make_context(cls.cli.name, args, parent=parent, obj=obj)
+    return cls(ctx, **ctx.params)
+
+
+def run_once(cls, url, flag, concurrency):
+    service = make_service(cls, url, flag)
+
+    start = time.perf_counter()
+    titles = service.get_titles()
+    titles_time = time.perf_counter() - start
+    titles = titles if isinstance(titles, list) else [titles]
+
+    def timed_tracks(title):
+        start = time.perf_counter()
+        try:
+            service.get_tracks(title)
+        except (Exception, SystemExit):
+            return None
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed_tracks, titles))
+    tracks_time = time.perf_counter() - start
+    return len(titles), titles_time, latencies, tracks_time
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {"p50_ms": None, "p95_ms": None, "max_ms": None}
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 2),
+        "p95_ms": round(samples[min(len(samples) - 1, int(0.95 * len(samples)))] * 1000, 2),
+        "max_ms": round(samples[-1] * 1000, 2),
+    }
+
+
+def bench(key, catalog, server, args):
+    name, flag = SERVICES[key]
+    cls = load_service(name)
+    patch_service(cls, server.url, args)
+    url = title_url(name, catalog)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = Path(tmp) / "warm"
+        if args.temperature == "warm":
+            reset_caches(cls, cache_dir)
+            run_once(cls, url, flag, args.concurrency)
+
+        server.requests.clear()
+        server.errors = 0
+        titles_times, tracks_times, latencies, failed, count = [], [], [], 0, 0
+        for i in range(args.iterations):
+            if args.temperature == "cold":
+                reset_caches(cls, Path(tmp) / f"cold{i}")
+            count, titles_time, tracks, tracks_time = run_once(cls, url, flag, args.concurrency)
+            titles_times.append(titles_time)
+            tracks_times.append(tracks_time)
+            latencies += [x for x in tracks if x is not None]
+            failed += sum(x is None for x in tracks)
+
+    return {
+        "service": name,
+        "titles": count,
+        "get_titles": {
+            "titles_per_s": round(count * len(titles_times) / sum(titles_times), 1),
+            **summarize(titles_times),
+        },
+        "get_tracks": {
+            "titles_per_s": round(len(latencies) / sum(tracks_times), 1) if latencies else 0,
+            "failed": failed,
+            **summarize(latencies),
+        },
+        "requests": sum(server.requests.values()) // args.iterations,
+        "errors_injected": server.errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--service", choices=[*SERVICES, "all"], default="all")
+    parser.add_argument("--episodes", type=int, default=100)
+    parser.add_argument("--seasons", type=int, default=4)
+    parser.add_argument("--variants", type=int, default=1, help="copies of the rendition ladder per master playlist")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.005)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--temperature", choices=["cold", "warm"], default="cold")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--rate-limit", action="store_true", help="keep the services' configured rate limits")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="show the services' log output")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+    catalog = Catalog(args.episodes, args.seasons, args.variants)
+    keys = list(SERVICES) if args.service == "all" else [args.service]
+
+    with StandIn(catalog, 0, args.latency, args.jitter, args.error_rate, args.error_status) as server:
+        results = [bench(key, catalog, server, args) for key in keys]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(
+        f"{len(catalog)} episodes, {catalog.seasons} season(s), {args.temperature} cache, "
+        f"concurrency {args.concurrency}, latency {args.latency * 1000:.0f}±{args.jitter * 1000:.0f} ms, "
+        f"error rate {args.error_rate:.0%}"
+    )
+    for res in results:
+        print(f"\n{res['service']}: {res['titles']} titles, {res['requests']} requests per iteration, "
+              f"{res['errors_injected']} injected errors")
+        for phase in ("get_titles", "get_tracks"):
+            x = res[phase]
+            failed = f"  failed {x['failed']}" if x.get("failed") else ""
+            print(
+                f"  {phase:<11} {x['titles_per_s']:>8} titles/s  "
+                f"p50 {x['p50_ms']} ms  p95 {x['p95_ms']} ms  max {x['max_ms']} ms{failed}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Heap kept by `Title.service_data` over a batch of titles, before and after slimming it.
+
+For every service, builds the payloads of `--titles` titles from the stand-in's
+synthetic catalog, parses them as the service does and keeps either what the
+baseline stored (Globoplay's whole playlist response, F1TV's whole CONTENT response,
+Meli Play's whole playbackContext) or the service's slim record, measuring the
+retained heap with tracemalloc. `--extra-fields` pads every payload with metadata
+fields the services don't read, as real responses carry dozens of them.
+
+    poetry run python benchmarks/service_data_memory.py --titles 1000
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+
+from standin import Catalog
+from vinetrimmer.services.f1tv import F1tvContent
+from vinetrimmer.services.globoplay import GloboplayVideo
+from vinetrimmer.services.meliplay import MeliPlayback
+
+BASE = "https://example.invalid"
+
+
+def pad(payload, fields):
+    payload.update({f"field_{i}": f"value {i} " * 4 for i in range(fields)})
+    return payload
+
+
+def payloads(catalog, extra_fields):
+    """(name, JSON texts, old service_data from parsed JSON, new service_data from parsed JSON) per service."""
+    meli = [
+        json.dumps(pad(catalog.meli_vcp(BASE, x)["components"]["player"]["playbackContext"], extra_fields))
+        for x in catalog.meli_ids
+    ]
+    globo = [
+        json.dumps({"videos": [pad(catalog.globo_video(Catalog.GLOBO_FIRST_VIDEO + i), extra_fields)]})
+        for i in range(len(catalog))
+    ]
+    f1 = []
+    for i in range(len(catalog)):
+        content = catalog.f1_content(Catalog.F1_FIRST_CONTENT + i)
+        pad(content["resultObj"]["containers"][0]["metadata"], extra_fields)
+        f1.append(json.dumps(content))
+
+    # The baseline kept the parsed payloads as they were
+    return [
+        ("Meliplay", meli, lambda x: x, MeliPlayback.from_context),
+        ("Globoplay", globo, lambda x: x, lambda x: GloboplayVideo(str(x["videos"][0]["id"]))),
+        (
+            "F1tv", f1, lambda x: x,
+            lambda x: F1tvContent(str(x["resultObj"]["containers"][0]["metadata"]["contentId"])),
+        ),
+    ]
+
+
+def retained(texts, project):
+    gc.collect()
+    tracemalloc.start()
+    kept = [project(json.loads(text)) for text in texts]
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return current, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--titles", type=int, default=1000)
+    parser.add_argument("--seasons", type=int, default=10)
+    parser.add_argument("--extra-fields", type=int, default=40)
+    args = parser.parse_args()
+
+    catalog = Catalog(args.titles, args.seasons)
+    print(f"{len(catalog)} titles per service")
+    for name, texts, old, new in payloads(catalog, args.extra_fields):
+        old_current, old_peak = retained(texts, old)
+        new_current, new_peak = retained(texts, new)
+        print(
+            f"  {name:<10} before {old_current / 1024:8.0f} KiB ({old_current / len(texts):6.0f} B/title)"
+            f"  after {new_current / 1024:8.0f} KiB ({new_current / len(texts):6.0f} B/title)"
+            f"  {1 - new_current / old_current:5.0%} less, peak {old_peak / 1024:.0f} → {new_peak / 1024:.0f} KiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
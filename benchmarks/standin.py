@@ -0,0 +1,374 @@
+"""
+Local stand-in for the Meli Play, Globoplay and F1TV APIs, serving a synthetic catalog.
+
+Only the endpoints and fields read by the services are served: Meli Play's `vcp` and
+season listings, Globoplay's playlist, program listing and video-session, F1TV's
+CONTENT, PLAY, `manifest.tme` and event page, plus an HLS master playlist per title.
+Every response can be delayed by a fixed latency (with jitter) and a share of the
+requests can be answered with an error status instead.
+
+    poetry run python benchmarks/standin.py --episodes 500 --seasons 10 --port 8800
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+VIDEO_VARIANTS = [
+    # (height, bandwidth, codecs, video range)
+    (2160, 16000000, "hvc1.2.4.L150.90,ec-3", "PQ"),
+    (2160, 12000000, "hvc1.2.4.L150.90,mp4a.40.2", "PQ"),
+    (1080, 6000000, "avc1.640028,ec-3", "SDR"),
+    (1080, 5000000, "avc1.640028,mp4a.40.2", "SDR"),
+    (720, 3000000, "avc1.64001f,mp4a.40.2", "SDR"),
+    (540, 1800000, "avc1.4d401f,mp4a.40.2", "SDR"),
+    (360, 800000, "avc1.4d401e,mp4a.40.2", "SDR"),
+]
+
+AUDIO_RENDITIONS = [
+    # (group, codec, language)
+    ("aac", "mp4a.40.2", "pt-BR"),
+    ("aac", "mp4a.40.2", "en"),
+    ("aac", "mp4a.40.2", "es"),
+    ("ec3", "ec-3", "pt-BR"),
+    ("ec3", "ec-3", "en"),
+]
+
+SUBTITLE_LANGUAGES = ["pt-BR", "en", "es"]
+
+
+def content_id(*parts):
+    return hashlib.md5(":".join(map(str, parts)).encode()).hexdigest()
+
+
+def master_playlist(base, variants=1):
+    """
+    HLS master playlist with `variants` copies of every rendition in VIDEO_VARIANTS and
+    AUDIO_RENDITIONS, e.g. to simulate one stream per CDN or bitrate ladder.
+    """
+    lines = ["#EXTM3U", "#EXT-X-INDEPENDENT-SEGMENTS"]
+    for copy in range(variants):
+        for group, codec, lang in AUDIO_RENDITIONS:
+            lines.append(
+                f'#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="{group}{copy}",LANGUAGE="{lang}",NAME="{lang}",'
+                f'DEFAULT={"YES" if lang == "pt-BR" else "NO"},AUTOSELECT=YES,CHANNELS="{6 if codec == "ec-3" else 2}",'
+                f'URI="{base}/audio_{group}_{lang}_{copy}.m3u8"'
+            )
+        for height, bandwidth, codecs, video_range in VIDEO_VARIANTS:
+            group = "ec3" if "ec-3" in codecs else "aac"
+            width = height * 16 // 9
+            lines += [
+                f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth + copy},CODECS="{codecs}",RESOLUTION={width}x{height},'
+                f'VIDEO-RANGE={video_range},FRAME-RATE=25.000,AUDIO="{group}{copy}"',
+                f"{base}/video_{height}_{bandwidth}_{copy}.m3u8",
+            ]
+    return "\n".join(lines) + "\n"
+
+
+class Catalog:
+    """
+    A synthetic show with `episodes` episodes spread over `seasons` seasons. The same
+    episodes are exposed as a Meli Play series, a Globoplay program and an F1TV event.
+    """
+
+    MELI_SHOW = "bench"
+    GLOBO_PROGRAM = 1000
+    GLOBO_FIRST_VIDEO = 2000000
+    F1_EVENT = 1000
+    F1_FIRST_CONTENT = 1000000000
+
+    def __init__(self, episodes=100, seasons=4, variants=1):
+        self.seasons = max(1, min(seasons, episodes))
+        self.variants = variants
+        # (season, episode) numbers, seasons as even as possible
+        self.numbers = []
+        for season in range(1, self.seasons + 1):
+            count = episodes // self.seasons + (season <= episodes % self.seasons)
+            self.numbers += [(season, episode) for episode in range(1, count + 1)]
+        self.meli_ids = [content_id(self.MELI_SHOW, s, e) for s, e in self.numbers]
+        self.meli_index = {x: i for i, x in enumerate(self.meli_ids)}
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def season_of(self, index):
+        return self.numbers[index][0]
+
+    # Meli Play
+
+    def meli_vcp(self, base, epi_id):
+        index = self.meli_index.get(epi_id)
+        if index is None:
+            return None
+        season, episode = self.numbers[index]
+        season_episodes = [x for i, x in enumerate(self.meli_ids) if self.season_of(i) == season]
+        return {"components": {
+            "player": {
+                "contentId": epi_id,
+                "ui": {"title": "Benchmark Show", "secondaryTitle": f"T{season}:E{episode} | Episode {episode}"},
+                "playbackContext": {
+                    "sources": {"dash": f"{base}/hls/meli/{epi_id}/master.m3u8"},
+                    "subtitles": [
+                        {"label": lang, "lang": lang, "url": f"{base}/subs/meli/{epi_id}/{lang}.vtt"}
+                        for lang in SUBTITLE_LANGUAGES
+                    ] + [{"label": "No", "lang": "disabled", "url": ""}],
+                    "drm": {"widevine": {
+                        "serverUrl": f"{base}/license",
+                        "httpRequestHeaders": {"x-dt-auth-token": "benchmark"},
+                    }},
+                },
+            },
+            "seasons-selector": {
+                "selector": {"props": {"tabs": [{"value": f"season-{x}"} for x in range(1, self.seasons + 1)]}},
+                "carousel": {"props": {"components": [{"props": {"contentId": x}} for x in season_episodes]}},
+            },
+        }}
+
+    def meli_season(self, season_id):
+        season = int(season_id.rsplit("-", 1)[-1]) if season_id.rsplit("-", 1)[-1].isdigit() else 0
+        return {"props": {"components": [
+            {"props": {"contentId": x}} for i, x in enumerate(self.meli_ids) if self.season_of(i) == season
+        ]}}
+
+    # Globoplay
+
+    def globo_video(self, video_id):
+        index = video_id - self.GLOBO_FIRST_VIDEO
+        if not 0 <= index < len(self):
+            return None
+        season, episode = self.numbers[index]
+        return {
+            "id": video_id,
+            "program_id": self.GLOBO_PROGRAM,
+            "program": "Benchmark Show",
+            "title": f"Episode {episode}",
+            "season": season,
+            "episode": episode,
+        }
+
+    def globo_page(self, page, per_page):
+        start = (page - 1) * per_page
+        ids = range(self.GLOBO_FIRST_VIDEO + start, self.GLOBO_FIRST_VIDEO + min(start + per_page, len(self)))
+        return {"videos": [self.globo_video(x) for x in ids], "has_next": start + per_page < len(self)}
+
+    # F1TV
+
+    def f1_content(self, content):
+        index = content - self.F1_FIRST_CONTENT
+        if not 0 <= index < len(self):
+            return None
+        return {"resultObj": {"containers": [{"metadata": {
+            "contentId": content,
+            "emfAttributes": {"Series": "FORMULA 1", "Global_Title": f"Session-{index + 1}"},
+        }}]}}
+
+    def f1_page(self):
+        return {"resultObj": {"containers": [{"retrieveItems": {"resultObj": {"containers": [
+            {"metadata": {
+                "contentId": self.F1_FIRST_CONTENT + i,
+                "contentType": "VIDEO",
+                "contentSubtype": "REPLAY",
+                "emfAttributes": {"sessionStartDate": str(1700000000000 + i)},
+            }}
+            for i in range(len(self))
+        ]}}}]}}
+
+
+class StandIn(ThreadingHTTPServer):
+    """
+    Threaded HTTP server answering for the catalog. Use as a context manager, the
+    server runs on a background thread until the block ends.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, catalog, port=0, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, seed=0):
+        super().__init__(("127.0.0.1", port), Handler)
+        self.catalog = catalog
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.errors = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.serve_forever, name="StandIn", daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self.shutdown()
+        self.server_close()
+
+    def delay_and_fail(self):
+        """Sleep for this request's latency, and return whether it should fail."""
+        with self.lock:
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            fail = self.random.random() < self.error_rate
+            self.errors += fail
+        if delay:
+            time.sleep(delay)
+        return fail
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; with Nagle on, delayed ACKs add ~40 ms per
+    # request on reused connections and would penalize connection pooling
+    disable_nagle_algorithm = True
+
+    ROUTES = [
+        ("GET", re.compile(r"^/api/vcp/(?P<id>[^/]+)$"), "meli_vcp"),
+        ("GET", re.compile(r"^/api/seasons/(?P<id>[^/]+)/episodes$"), "meli_season"),
+        ("GET", re.compile(r"^/videos/(?P<id>\d+)/playlist/?$"), "globo_playlist"),
+        ("GET", re.compile(r"^/programs/(?P<id>\d+)/videos$"), "globo_program"),
+        ("POST", re.compile(r"^/v4/video-session$"), "globo_session"),
+        ("GET", re.compile(r"^/3\.0/R/[^/]+/[^/]+/ALL/CONTENT/VIDEO/(?P<id>\d+)/"), "f1_content"),
+        ("GET", re.compile(r"^/2\.0/R/[^/]+/[^/]+/ALL/CONTENT/PLAY$"), "f1_play"),
+        ("GET", re.compile(r"^/f1/(?P<id>\d+)/manifest\.tme$"), "f1_tme"),
+        ("GET", re.compile(r"^/2\.0/R/[^/]+/[^/]+/ALL/PAGE/(?P<id>\d+)/"), "f1_page"),
+        ("GET", re.compile(r"^/hls/(?P<service>[^/]+)/(?P<id>[^/]+)/(?:master|index)\.m3u8$"), "hls_master"),
+        ("GET", re.compile(r"^/subs/(?P<service>[^/]+)/(?P<id>[^/]+)/(?P<lang>[^/]+)\.vtt$"), "subtitle"),
+    ]
+
+    def log_message(self, *_):
+        pass
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.body = self.rfile.read(length) if length else b""
+        self.dispatch("POST")
+
+    def dispatch(self, method):
+        url = urlsplit(self.path)
+        self.query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        for route_method, pattern, name in self.ROUTES:
+            m = pattern.match(url.path)
+            if route_method == method and m:
+                break
+        else:
+            return self.reply(404, {"error": "not found"})
+
+        with self.server.lock:
+            self.server.requests[name] += 1
+        if self.server.delay_and_fail():
+            return self.reply(self.server.error_status, {"error": "injected"})
+
+        result = getattr(self, name)(**m.groupdict())
+        if result is None:
+            return self.reply(404, {"error": "unknown id"})
+        self.reply(200, result)
+
+    def reply(self, status, body):
+        if isinstance(body, str):
+            data, content_type = body.encode(), "application/vnd.apple.mpegurl"
+            if self.path.endswith(".vtt"):
+                content_type = "text/vtt"
+        else:
+            data, content_type = json.dumps(body).encode(), "application/json"
+
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            status, data = 304, b""
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        if status in (200, 304):
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+    @property
+    def base(self):
+        return f"http://{self.headers.get('Host')}"
+
+    def meli_vcp(self, id):
+        return self.server.catalog.meli_vcp(self.base, id)
+
+    def meli_season(self, id):
+        return self.server.catalog.meli_season(id)
+
+    def globo_playlist(self, id):
+        video = self.server.catalog.globo_video(int(id))
+        return {"videos": [video]} if video else None
+
+    def globo_program(self, id):
+        if int(id) != Catalog.GLOBO_PROGRAM:
+            return None
+        return self.server.catalog.globo_page(int(self.query.get("page", 1)), int(self.query.get("per_page", 50)))
+
+    def globo_session(self):
+        video_id = json.loads(self.body or b"{}").get("video_id")
+        return {
+            "sources": [{"url": f"{self.base}/hls/globo/{video_id}/master.m3u8"}],
+            "resource": {"content_protection": {"server": f"{self.base}/license/{{{{deviceId}}}}"}},
+        }
+
+    def f1_content(self, id):
+        return self.server.catalog.f1_content(int(id))
+
+    def f1_play(self):
+        content = self.query.get("contentId")
+        return {"resultObj": {"url": f"{self.base}/f1/{content}/manifest.tme", "laURL": f"{self.base}/license"}}
+
+    def f1_tme(self, id):
+        return {"feeds": [{"url": ""}, {"url": f"{self.base}/hls/f1/{id}/index.m3u8"}]}
+
+    def f1_page(self, id):
+        return self.server.catalog.f1_page() if int(id) == Catalog.F1_EVENT else None
+
+    def hls_master(self, service, id):
+        return master_playlist(f"{self.base}/hls/{service}/{id}", self.server.catalog.variants)
+
+    def subtitle(self, service, id, lang):
+        cues = "\n\n".join(
+            f"00:{i // 60:02d}:{i % 60:02d}.000 --> 00:{i // 60:02d}:{i % 60:02d}.900\nLine {i} ({lang})"
+            for i in range(120)
+        )
+        return f"WEBVTT\n\n{cues}\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--episodes", type=int, default=100)
+    parser.add_argument("--seasons", type=int, default=4)
+    parser.add_argument("--variants", type=int, default=1, help="copies of the rendition ladder per master playlist")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    args = parser.parse_args()
+
+    catalog = Catalog(args.episodes, args.seasons, args.variants)
+    server = StandIn(
+        catalog, args.port, args.latency, args.jitter, args.error_rate, args.error_status
+    )
+    print(f"Serving {len(catalog)} episodes in {catalog.seasons} season(s) on {server.url}")
+    print(f"  Meli Play  {server.url}/api/vcp/{catalog.meli_ids[0]}")
+    print(f"  Globoplay  {server.url}/videos/{Catalog.GLOBO_FIRST_VIDEO}/playlist/")
+    print(f"  F1TV       {server.url}/2.0/R/ENG/BIG_SCREEN_HLS/ALL/PAGE/{Catalog.F1_EVENT}/F1_TV_Pro_Annual/2")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
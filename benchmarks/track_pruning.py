@@ -0,0 +1,56 @@
+"""
+Time spent turning a large HLS master playlist into Tracks, with and without pruning.
+
+Builds synthetic master playlists with `--variants` copies of the stand-in's rendition
+ladder, then times Tracks.from_m3u8 on the whole playlist against TrackSelection's
+pruning followed by Tracks.from_m3u8 on what's left.
+
+    poetry run python benchmarks/track_pruning.py --variants 1 10 50 --vcodec H264 --acodec AAC --alang pt
+"""
+import argparse
+import statistics
+import time
+
+import m3u8
+
+from standin import master_playlist
+from vinetrimmer.objects import Tracks
+from vinetrimmer.utils.track_selection import TrackSelection
+
+
+def timed(fn, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--variants", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--vcodec", default="H264")
+    parser.add_argument("--acodec", default="AAC")
+    parser.add_argument("--quality", type=int, default=1080)
+    parser.add_argument("--range", dest="range_", default="SDR")
+    parser.add_argument("--alang", nargs="*", default=["pt"])
+    args = parser.parse_args()
+
+    selection = TrackSelection(args.vcodec, args.acodec, args.quality, args.range_, args.alang)
+    for variants in args.variants:
+        playlist = m3u8.loads(master_playlist("https://example.invalid/hls", variants),
+                              uri="https://example.invalid/hls/master.m3u8")
+
+        full_ms, full = timed(lambda: Tracks.from_m3u8(playlist, source="BENCH"), args.runs)
+        pruned_ms, pruned = timed(lambda: Tracks.from_m3u8(selection.prune_m3u8(playlist), source="BENCH"), args.runs)
+        print(
+            f"{variants:>4} ladder(s): {len(full.videos):>4} videos {len(full.audios):>4} audios {full_ms:8.2f} ms"
+            f"  → pruned {len(pruned.videos):>4} videos {len(pruned.audios):>4} audios {pruned_ms:8.2f} ms"
+            f"  ({full_ms / pruned_ms:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
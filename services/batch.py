@@ -0,0 +1,187 @@
+import copy
+import shlex
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import MozillaCookieJar
+from pathlib import Path
+
+import click
+from vinetrimmer.services.BaseService import BaseService
+from vinetrimmer.services.registry import ALIAS_INDEX, MANIFEST, load_service, match_title
+from vinetrimmer.utils.collections import as_list
+from vinetrimmer.utils.service_config import load_service_config
+
+
+class Batch(BaseService):
+    """
+    Resolve a list of Globoplay, F1TV and Meli Play titles in one process.
+
+    \b
+    Every line of the file is an URL, or an alias followed by an ID, optionally followed
+    by that service's own flags, e.g.:
+        https://globoplay.globo.com/v/13655941/
+        F1TV 1000009032
+        https://play.mercadolivre.com.br/assistir/piloto/a61052a39bc44bdf8854b2cc3d1668a8 -s
+    Empty lines and lines starting with # are ignored, repeated titles are only resolved once.
+    """
+
+    ALIASES = ["BATCH"]
+
+    # The argument is a file path, not an URL
+    TITLE_RE = None
+
+    COOKIES_DIR = Path(__file__).resolve().parent.parent / "Cookies"
+
+    @staticmethod
+    @click.command(name="Batch", short_help="Resolve a list of titles from several services")
+    @click.argument("title", type=click.Path(exists=True, dir_okay=False), required=False)
+
+    @click.pass_context
+    def cli(ctx, **kwargs):
+        return Batch(ctx, **kwargs)
+
+    def __init__(self, ctx, title):
+        super().__init__(ctx)
+        self.parse_title(ctx, title)
+        self.init_resolver(ctx)
+
+    def init_resolver(self, ctx):
+        self.ctx = ctx
+        self.config = load_service_config("batch")
+        self.limits = {}
+        self.sessions = {}
+        self.cookie_jars = {}
+        self.owners = {}
+        self.lock = threading.Lock()
+
+    def get_titles(self):
+        with open(self.title, "r", encoding="utf-8") as f:
+            results = self.resolve(f.read().splitlines())
+
+        titles = [title for _, res in results if not isinstance(res, BaseException) for title in res]
+        failures = [(line, res) for line, res in results if isinstance(res, BaseException)]
+        self.log.info(f" + Resolved {len(titles)} title(s) from {len(results) - len(failures)}/{len(results)} item(s)")
+        for line, error in failures:
+            self.log.warning(f" - Failed {line!r}: {error!r}")
+        return titles
+
+    def resolve(self, lines):
+        """
+        Resolve every unique item of `lines` through a shared scheduler. Returns a
+        (line, titles or exception) pair per item, in input order.
+        """
+        items = self.parse_items(lines)
+        with ThreadPoolExecutor(max_workers=self.config.get("concurrency", 8)) as pool:
+            results = list(pool.map(self.resolve_item, items))
+        return [(item[3], res) for item, res in zip(items, results)]
+
+    def parse_items(self, lines):
+        items, seen = [], set()
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            args = shlex.split(line)
+            name = ALIAS_INDEX.get(args[0].lower()) if len(args) > 1 else None
+            if name:
+                value, args = args[1], args[2:]
+                title_id = value
+            else:
+                value, args = args[0], args[1:]
+                name, groups = match_title(value)
+                title_id = groups.get("id") or value
+            key = (name, title_id, tuple(args))
+            if key not in seen:
+                seen.add(key)
+                items.append((name, value, args, line))
+        return items
+
+    def resolve_item(self, item):
+        name, value, args, line = item
+        # Batch and Daemon have no hosts, they can't be items themselves
+        if not name or not MANIFEST[name]["hosts"]:
+            return LookupError("no service matches this URL or alias")
+        with self.limit(name):
+            try:
+                service = self.get_service(name, value, args)
+                # Streamed when the service supports it, so titles are handled as they arrive
+                if hasattr(service, "iter_titles"):
+                    titles = service.iter_titles()
+                else:
+                    titles = as_list(service.get_titles())
+                results = []
+                for title in titles:
+                    self.register(title, service)
+                    results.append(self.collect(title))
+            except (Exception, SystemExit) as e:
+                return e
+        return results
+
+    def register(self, title, service):
+        with self.lock:
+            self.owners[(title.source, str(title.id))] = service
+
+    def collect(self, title):
+        """What is kept of each resolved title."""
+        return title
+
+    def limit(self, name):
+        with self.lock:
+            if name not in self.limits:
+                per_service = self.config.get("per_service") or {}
+                self.limits[name] = threading.BoundedSemaphore(per_service.get(name, 2))
+            return self.limits[name]
+
+    def get_service(self, name, value, args):
+        cls = load_service(name)
+        obj = copy.copy(self.ctx.obj)
+        obj.cookies = self.get_cookies(name)
+        sub = cls.cli.make_context(cls.cli.name, [value, *args], parent=self.ctx.parent, obj=obj)
+        service = cls(sub, **sub.params)
+
+        # Reuse one session (and its connection pool) per service
+        with self.lock:
+            session = self.sessions.setdefault(name, service.session)
+        if session is not service.session:
+            service.session.close()
+            service.session = session
+            for helper in ("manifests", "subtitle_cache"):
+                if getattr(service, helper, None):
+                    getattr(service, helper).session = session
+        return service
+
+    def get_cookies(self, name):
+        profile = getattr(self.ctx.obj, "profile", None) or "default"
+        for folder in (name, name.lower()):
+            path = self.COOKIES_DIR / folder / f"{profile}.txt"
+            if path.exists():
+                return self.load_cookies(path)
+        return None
+
+    def load_cookies(self, path):
+        # Parsed once, until the file changes
+        stamp = path.stat().st_mtime_ns
+        with self.lock:
+            cached = self.cookie_jars.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        jar = MozillaCookieJar(path)
+        jar.load(ignore_discard=True, ignore_expires=True)
+        with self.lock:
+            self.cookie_jars[path] = (stamp, jar)
+        return jar
+
+    def owner(self, title):
+        return self.owners[(title.source, str(title.id))]
+
+    def get_tracks(self, title):
+        return self.owner(title).get_tracks(title)
+
+    def get_chapters(self, title):
+        return self.owner(title).get_chapters(title)
+
+    def certificate(self, **kwargs):
+        return self.owner(kwargs["title"]).certificate(**kwargs)
+
+    def license(self, challenge, **kwargs):
+        return self.owner(kwargs["title"]).license(challenge=challenge, **kwargs)
@@ -0,0 +1,146 @@
+import json
+import os
+import secrets
+import socketserver
+import threading
+import time
+from pathlib import Path
+
+import click
+from vinetrimmer.services.BaseService import BaseService
+from vinetrimmer.services.batch import Batch
+from vinetrimmer.utils.http_metrics import METRICS
+
+
+class Daemon(Batch):
+    """
+    Keep services, configs, caches and connections warm between title lookups.
+
+    \b
+    Serves title resolution jobs on a local port until stopped. Each job is a list of
+    lines in the same format as a Batch file, sent by `utils/daemon_client.py`:
+        python vinetrimmer/utils/daemon_client.py MELI -as https://play.mercadolivre.com.br/assistir/piloto/a61052a39bc44bdf8854b2cc3d1668a8
+    """
+
+    ALIASES = ["DAEMON"]
+
+    # There is no title argument
+    TITLE_RE = None
+
+    STATE_FILE = Path(__file__).resolve().parent.parent / "Cache" / "daemon.json"
+
+    @staticmethod
+    @click.command(name="Daemon", short_help="Serve title lookups from a long-lived process")
+    @click.option("--port", type=int, default=None, help="Local port to listen on, a free one by default.")
+
+    @click.pass_context
+    def cli(ctx, **kwargs):
+        return Daemon(ctx, **kwargs)
+
+    def __init__(self, ctx, port):
+        BaseService.__init__(self, ctx)
+        self.init_resolver(ctx)
+
+        self.daemon_config = self.config.get("daemon") or {}
+        self.port = port if port is not None else self.daemon_config.get("port", 0)
+        self.token = secrets.token_urlsafe(32)
+        self.jobs = 0
+
+    def get_titles(self):
+        server = DaemonServer(("127.0.0.1", self.port), DaemonHandler, self)
+        self.write_state(server.server_address[1])
+        self.log.info(f" + Listening on 127.0.0.1:{server.server_address[1]}, stop with Ctrl+C")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.STATE_FILE.unlink(missing_ok=True)
+        self.log.info(f" + Stopped after {self.jobs} job(s)")
+        return []
+
+    def write_state(self, port):
+        # Only readable by this user, the token is all that protects the port
+        self.STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        temp = self.STATE_FILE.with_name(f"{self.STATE_FILE.name}.{os.getpid()}.tmp")
+        fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"port": port, "token": self.token, "pid": os.getpid()}, f)
+        os.replace(temp, self.STATE_FILE)
+
+    def handle(self, request):
+        if not secrets.compare_digest(str(request.get("token", "")), self.token):
+            return {"ok": False, "error": "invalid token"}
+        job = request.get("job")
+        if job == "ping":
+            return {"ok": True, "jobs": self.jobs}
+        if job == "stop":
+            return {"ok": True, "stop": True}
+        if job == "metrics":
+            # Live HTTP metrics of every job so far, as JSON or Prometheus text
+            if request.get("format") == "prometheus":
+                return {"ok": True, "prometheus": METRICS.prometheus()}
+            return {"ok": True, "metrics": METRICS.report()}
+        if job != "resolve":
+            return {"ok": False, "error": f"unknown job {job!r}"}
+
+        start = time.perf_counter()
+        results = self.resolve(request.get("lines") or [])
+        with self.lock:
+            self.jobs += 1
+        return {
+            "ok": True,
+            "elapsed": round(time.perf_counter() - start, 6),
+            "results": [
+                {"line": line, "error": repr(res)} if isinstance(res, BaseException)
+                else {"line": line, "titles": res}
+                for line, res in results
+            ],
+        }
+
+    def register(self, title, service):
+        # Titles are only resolved here, nothing will ask for their tracks
+        pass
+
+    def collect(self, title):
+        # Only the description is kept, the Title and its service_data are freed as the job goes
+        return self.describe(title)
+
+    @staticmethod
+    def describe(title):
+        type_ = getattr(title, "type", None)
+        return {
+            "id": str(title.id),
+            "source": title.source,
+            "type": getattr(type_, "name", type_),
+            "name": title.name,
+            "season": getattr(title, "season", None),
+            "episode": getattr(title, "episode", None),
+            "episode_name": getattr(title, "episode_name", None),
+        }
+
+
+class DaemonServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, handler, service):
+        self.service = service
+        super().__init__(address, handler)
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    """One JSON request per line, answered with one JSON line."""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.service.handle(json.loads(line))
+            except ValueError as e:
+                response = {"ok": False, "error": f"invalid request: {e}"}
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+            if response.get("stop"):
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
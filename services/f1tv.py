@@ -2,8 +2,28 @@ import json
 import click
 from vinetrimmer.objects import AudioTrack, TextTrack, Title, Tracks, VideoTrack
 from vinetrimmer.services.BaseService import BaseService
+from vinetrimmer.utils.cache_store import CacheStore, NullStore
+from vinetrimmer.utils.cassette import CASSETTE
+from vinetrimmer.utils.concurrency import imap_ordered
+from vinetrimmer.utils.manifests import ManifestFetcher
+from vinetrimmer.utils.service_config import load_service_config
+from vinetrimmer.utils.session_layers import install_session_layers
+from vinetrimmer.utils.track_selection import TrackSelection
+from vinetrimmer.utils.tracing import span, traced
 from click.core import ParameterSource
-import m3u8
+from requests import HTTPError
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import hashlib
+import threading
+
+class F1tvContent:
+    """Service data of an F1TV title. get_tracks requests playback from the content ID alone."""
+    __slots__ = ("content_id",)
+
+    def __init__(self, content_id):
+        self.content_id = content_id
+
 
 class F1tv(BaseService):
     """
@@ -19,13 +39,18 @@ class F1tv(BaseService):
 
     TITLE_RE = [
         r"^https?://f1tv\.formula1\.com/detail/(?P<id>\d+)/",
+        r"^https?://f1tv\.formula1\.com/(?P<page>page)/(?P<id>\d+)",
     ]
+    
+    # Content subtypes listed on a race weekend page that are sessions
+    EVENT_SUBTYPES = ["REPLAY", "LIVE"]
+
+    CACHE_DIR = Path(__file__).resolve().parent.parent / "Cache" / "F1TV"
+    CACHE_FILE = CACHE_DIR / "playback.db"
 
-    AUDIO_CODEC_MAP = {
-        "AAC": "mp4a",
-        "AC3": "ac-3",
-        "EC3": "ec-3"
-    }
+    # Opened once per process and shared by every instance, like the manifest store
+    feed_cache = None
+    feed_cache_lock = threading.Lock()
 
     @staticmethod
     @click.command(name="F1tv", short_help="https://f1tv.formula1.com/")
@@ -37,16 +62,19 @@ class F1tv(BaseService):
 
     def __init__(self, ctx, title):
         super().__init__(ctx)
-        self.parse_title(ctx, title)
+        # Race weekend (event) pages are expanded into all of their sessions
+        with span("parse_title"):
+            self.is_event = bool((self.parse_title(ctx, title) or {}).get("page"))
         
-        import yaml
-        #Read YAML file
-        with open("./vinetrimmer/config/Services/f1tv.yml", 'r') as stream:
-            self.config = yaml.safe_load(stream)
+        self.config = load_service_config("f1tv")
+        install_session_layers(
+            self.session, "f1tv", self.config,
+            cache_prefixes=[self.config["endpoints"]["title"].split("{")[0]],
+            vary=("entitlementtoken",)
+        )
 
         self.vquality_source = ctx.get_parameter_source("vquality")
         self.vcodec = ctx.parent.params["vcodec"] or "H264"
-        self.acodec = ctx.parent.params["acodec"]
         self.quality = ctx.parent.params.get("quality") or 1080
         self.range = ctx.parent.params["range_"] or "SDR"
         
@@ -68,7 +96,10 @@ class F1tv(BaseService):
             else:
                 self.device = self.config["devices"]["web"]["DeviceInfo"]
                 self.ua = self.config["devices"]["web"]["UserAgent"]
-                
+        
+        # The device chosen above decides the codec and range, prune the manifest with those
+        self.selection = TrackSelection.from_context(ctx, vcodec=self.vcodec, range_=self.range)
+        
         self.region = self.config["region"]
         self.plan = self.config["plan"]
 
@@ -78,74 +109,153 @@ class F1tv(BaseService):
             'x-f1-device-info': self.device,
             'user-agent': self.ua
         }
+        self.manifests = ManifestFetcher(
+            self.session, ttl=0 if CASSETTE.enabled else self.config.get("manifest_cache_seconds", 300)
+        )
+        
+        # PLAY requests are started as soon as the content ID is known, alongside CONTENT
+        self.playback = {}
+        self.feed_ttl = self.config.get("tme_cache_seconds", 300)
         
+    @traced("F1tv.get_titles")
     def get_titles(self):
+        if self.is_event:
+            content_ids = self.get_event_content_ids(self.title)
+            self.log.info(f" + Found {len(content_ids)} session(s) on this event")
+            return list(imap_ordered(self.get_title, content_ids, self.config.get("concurrency", 4)))
+        
+        self.prefetch_playback(self.title)
+        return self.get_title(self.title)
+        
+    def get_title(self, content_id):
         params = {
-            'contentId': self.title,
+            'contentId': content_id,
             'entitlement': self.plan,
             'homeCountry': self.region, # Replace with your home country / country your account is based on?
         }
         enp1=self.config["endpoints"]["title"]
         
         res = self.session.get(
-                enp1.format(title_id=self.title, plan=self.plan, region=self.region),
-                headers=self.headers,params=params).json()
+                enp1.format(title_id=content_id, plan=self.plan, region=self.region),
+                headers=self.headers,params=params)
         try:
-            res
-        except json.JSONDecodeError:
+            res.raise_for_status()
+            res = res.json()
+        except (HTTPError, json.JSONDecodeError):
             raise self.log.exit(f" - Failed to load title manifest: {res.text}")
 
         original_language = "en-US"
         fres=res["resultObj"]["containers"][0]["metadata"]
         return Title(
-                id_=self.title,
+                id_=content_id,
                 type_=Title.Types.MOVIE,
                 name=(fres["emfAttributes"]["Series"]+" "+fres["emfAttributes"]["Global_Title"]).replace("-"," "),
                  original_lang=original_language,
                 source=self.ALIASES[0],
-                service_data=res,
+                service_data=F1tvContent(content_id),
             )
+    
+    def get_event_content_ids(self, page_id):
+        res = self.session.get(
+            self.config["endpoints"]["page"].format(page_id=page_id, plan=self.plan),
+            headers=self.headers
+        )
+        try:
+            res.raise_for_status()
+            containers = res.json()["resultObj"]["containers"]
+        except (HTTPError, json.JSONDecodeError, KeyError):
+            raise self.log.exit(f" - Failed to load event page: {res.text}")
         
-    def get_tracks(self, title):
+        sessions = {}
+        for container in containers:
+            items = ((container.get("retrieveItems") or {}).get("resultObj") or {}).get("containers") or []
+            for item in items:
+                metadata = item.get("metadata") or {}
+                content_id = metadata.get("contentId")
+                if (content_id and metadata.get("contentType") == "VIDEO"
+                        and metadata.get("contentSubtype") in self.EVENT_SUBTYPES):
+                    start = str((metadata.get("emfAttributes") or {}).get("sessionStartDate") or 0)
+                    sessions.setdefault(str(content_id), int(start) if start.isdigit() else 0)
+        
+        if not sessions:
+            raise self.log.exit(f" - No sessions found on event page {page_id}")
+        
+        # Page order breaks ties, dicts keep insertion order and sorted() is stable
+        return sorted(sessions, key=lambda x: sessions[x])
+        
+    def prefetch_playback(self, content_id):
+        if content_id not in self.playback:
+            pool = ThreadPoolExecutor(max_workers=1)
+            self.playback[content_id] = pool.submit(self.get_playback, content_id)
+            # The worker thread exits as soon as the request is done
+            pool.shutdown(wait=False)
+    
+    def get_feed_cache(self):
+        if CASSETTE.enabled:
+            return NullStore()
+        with self.feed_cache_lock:
+            if F1tv.feed_cache is None:
+                F1tv.feed_cache = CacheStore(self.CACHE_FILE)
+        return F1tv.feed_cache
+    
+    def get_playback(self, content_id):
         if self.range == "HDR10":
-            querystring = { "contentId": self.title, "player": "player_tm" }
+            querystring = { "contentId": content_id, "player": "player_tm" }
         else:
-            querystring = { "contentId": self.title }
+            querystring = { "contentId": content_id }
             
-        program_data = self.session.get(
+        res = self.session.get(
             url=self.config["endpoints"]["tracks"],
             params=querystring,
             headers=self.headers
-        ).json()["resultObj"]
-        
+        )
         try:
-            self.lic_url=program_data["laURL"]
-        except:
-            pass
-            
+            res.raise_for_status()
+            program_data = res.json()["resultObj"]
+        except (HTTPError, json.JSONDecodeError, KeyError):
+            raise self.log.exit(f" - Failed to load playback info: {res.text}")
+        
         manifest_url=program_data["url"]
             
         if "manifest.tme" in manifest_url:
-            program_data = self.session.get(
-                url=manifest_url,
-                params=querystring,
-                headers=self.headers
-            ).json()
-            manifest_url=program_data["feeds"][1]["url"]
+            # The resolved feed stays valid for a while, skip the extra hop while it does
+            # The feed depends on the device (web, android or tvos) and on the account
+            identity = hashlib.sha256(
+                f"{self.headers['x-f1-device-info']}\n{self.headers['entitlementtoken']}".encode("utf-8")
+            ).hexdigest()[:16]
+            feed_key = f"tme:{content_id}:{querystring.get('player', '')}:{identity}"
+            feed_url = self.get_feed_cache().get(feed_key)
+            if feed_url is None:
+                feed_url = self.session.get(
+                    url=manifest_url,
+                    params=querystring,
+                    headers=self.headers
+                ).json()["feeds"][1]["url"]
+                self.get_feed_cache().set(feed_key, feed_url, ttl=self.feed_ttl)
+            manifest_url = feed_url
+        
+        return program_data.get("laURL"), manifest_url
+        
+    @traced("F1tv.get_tracks")
+    def get_tracks(self, title):
+        future = self.playback.pop(title.id, None)
+        lic_url, manifest_url = future.result() if future else self.get_playback(title.id)
+        if lic_url:
+            self.lic_url = lic_url
 
         self.log.warning(f" + Downloading Manifest ---> {manifest_url}")
         if manifest_url.find("index.m3u8")==-1:
-            return Tracks.from_mpd(
-                url=manifest_url,
-                session=self.session,
-                source=self.ALIASES[0]
-            )
+            with span("tracks.from_mpd"):
+                return Tracks.from_mpd(
+                    url=manifest_url,
+                    session=self.session,
+                    source=self.ALIASES[0]
+                )
         else:
-            tracks = Tracks.from_m3u8(m3u8.load(manifest_url), source=self.ALIASES[0])
-            if self.acodec:
-                tracks.audios = [
-                    x for x in tracks.audios if (x.codec or "").split("-")[0] in self.AUDIO_CODEC_MAP[self.acodec]
-                ]
+            playlist = self.selection.prune_m3u8(self.manifests.load_m3u8(manifest_url))
+            with span("tracks.from_m3u8"):
+                tracks = Tracks.from_m3u8(playlist, source=self.ALIASES[0])
+            self.selection.filter_tracks(tracks)
             for video in tracks.videos:
                 # This is needed to remove weird glitchy NOP data at the end of stream
                 video.needs_repack = True
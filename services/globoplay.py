@@ -2,7 +2,23 @@ import json
 import click
 from vinetrimmer.objects import AudioTrack, TextTrack, Title, Tracks, VideoTrack
 from vinetrimmer.services.BaseService import BaseService
-import m3u8
+from vinetrimmer.utils.cassette import CASSETTE
+from vinetrimmer.utils.concurrency import imap_ordered
+from vinetrimmer.utils.manifests import ManifestFetcher
+from vinetrimmer.utils.service_config import load_service_config
+from vinetrimmer.utils.session_layers import install_session_layers
+from vinetrimmer.utils.track_selection import TrackSelection
+from vinetrimmer.utils.tracing import span, traced
+from concurrent.futures import ThreadPoolExecutor
+from requests import HTTPError
+
+class GloboplayVideo:
+    """Service data of a Globoplay title. get_tracks starts a video session from the ID alone."""
+    __slots__ = ("id",)
+
+    def __init__(self, id):
+        self.id = id
+
 
 class Globoplay(BaseService):
     """
@@ -19,72 +35,147 @@ class Globoplay(BaseService):
         r"^https?://globoplay\.globo\.com/(?:v|[^/]+/[^/]+)/(?P<id>\d+)",
     ]
 
-    AUDIO_CODEC_MAP = {
-        "AAC": "mp4a",
-        "AC3": "ac-3",
-        "EC3": "ec-3"
-    }
-
     @staticmethod
     @click.command(name="Globoplay", short_help="https://globoplay.globo.com/")
     @click.argument("title", type=str, required=False)
+    @click.option("-s", "--season", is_flag=True, default=False, help="Get all episodes of that episode's season.")
+    @click.option("-as", "--all-seasons", is_flag=True, default=False, help="Get all episodes of the program.")
    
     @click.pass_context
     def cli(ctx, **kwargs):
         return Globoplay(ctx, **kwargs)
 
-    def __init__(self, ctx, title):
+    def __init__(self, ctx, title, season, all_seasons):
         super().__init__(ctx)
-        self.parse_title(ctx, title)
+        with span("parse_title"):
+            self.parse_title(ctx, title)
         
-        import yaml
-        #Read YAML file
-        with open("./vinetrimmer/config/Services/globoplay.yml", 'r') as stream:
-            self.config = yaml.safe_load(stream)
+        self.config = load_service_config("globoplay")
+        # The account is only known by its GLBID cookie, authorization is set later by get_tracks
+        install_session_layers(
+            self.session, "globoplay", self.config,
+            cache_prefixes=[self.config["endpoints"]["title"].split("{")[0]],
+            vary_cookies=("GLBID",)
+        )
+        self.season = season
+        self.allseason = all_seasons
+        self.concurrency = max(1, int(self.config.get("concurrency", 1)))
 
-        self.acodec = ctx.parent.params["acodec"]
+        self.selection = TrackSelection.from_context(ctx)
         
         self.headers = {
             'authority': 'globo.com',
             'referer': 'https://globoplay.globo.com/',
             'user-agent': self.config["UserAgent"]
         }
+        self.manifests = ManifestFetcher(
+            self.session, ttl=0 if CASSETTE.enabled else self.config.get("manifest_cache_seconds", 300)
+        )
         
+    @traced("Globoplay.get_titles")
     def get_titles(self):
+        video = self.get_video(self.title)
+        
+        if not (self.season or self.allseason):
+            return self.get_title(video, Title.Types.MOVIE)
+        
+        if not video.get("program_id"):
+            self.log.warning(f" + This video doesn't belong to a program, getting as a movie")
+            return self.get_title(video, Title.Types.MOVIE)
+        
+        if not self.allseason and video.get("season") is None:
+            self.log.warning(f" + This video has no season, getting as a movie")
+            return self.get_title(video, Title.Types.MOVIE)
+        
+        season = None if self.allseason else video["season"]
+        episodes = [
+            x["id"] for x in self.iter_program_videos(video["program_id"])
+            if season is None or x.get("season") == season
+        ]
+        self.log.info(f" + Found {len(episodes)} episode(s)")
+        
+        return [
+            self.get_title(episode, Title.Types.TV)
+            for episode in imap_ordered(self.get_video, episodes, self.concurrency)
+        ]
+        
+    def get_video(self, video_id):
         glbapi=self.config["endpoints"]["title"]
         
         res = self.session.get(
-                glbapi.format(title_id=self.title),
-                headers=self.headers).json()
+                glbapi.format(title_id=video_id),
+                headers=self.headers)
         try:
-            res
-        except json.JSONDecodeError:
+            res.raise_for_status()
+            return res.json()["videos"][0]
+        except (HTTPError, json.JSONDecodeError, KeyError, IndexError):
             raise self.log.exit(f" - Failed to load title manifest: {res.text}")
-
+    
+    def get_title(self, video, type_):
         original_language = "pt-BR"
-        fres=res["videos"]
-        return Title(
-                id_=self.title,
-                type_=Title.Types.MOVIE,
-                name=(fres[0]["program"]+" - "+fres[0]["title"]),
-                original_lang=original_language,
-                source=self.ALIASES[0],
-                service_data=res,
-            )
+        title_kwargs = {
+            "id_": str(video["id"]),
+            "type_": type_,
+            "original_lang": original_language,
+            "source": self.ALIASES[0],
+            "service_data": GloboplayVideo(str(video["id"])),
+        }
+        if type_ == Title.Types.TV:
+            title_kwargs["name"] = video["program"]
+            title_kwargs["season"] = video.get("season") or 1
+            title_kwargs["episode"] = video.get("episode") or video.get("episode_number") or 0
+            title_kwargs["episode_name"] = video["title"]
+        else:
+            title_kwargs["name"] = video["program"]+" - "+video["title"]
+        return Title(**title_kwargs)
+    
+    def iter_program_videos(self, program_id):
+        """
+        Yield the program's episodes page by page. The next page is requested while the
+        current one is being consumed.
+        """
+        per_page = self.config.get("episodes_per_page", 50)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            page = 1
+            future = pool.submit(self.get_program_page, program_id, page, per_page)
+            while future:
+                res = future.result()
+                videos = res.get("videos") or []
+                has_next = res.get("has_next", len(videos) == per_page)
+                page += 1
+                future = pool.submit(self.get_program_page, program_id, page, per_page) if has_next and videos else None
+                yield from videos
+    
+    def get_program_page(self, program_id, page, per_page):
+        res = self.session.get(
+            self.config["endpoints"]["episodes"].format(program_id=program_id, page=page, per_page=per_page),
+            headers=self.headers
+        )
+        try:
+            res.raise_for_status()
+            return res.json()
+        except (HTTPError, json.JSONDecodeError):
+            raise self.log.exit(f" - Failed to load program episodes: {res.text}")
         
+    @traced("Globoplay.get_tracks")
     def get_tracks(self, title):
-        payload = { "player_type": self.config["video-request"]["playerType"], "video_id": self.title, "quality": "max", "content_protection": "widevine", "tz": "-03:00", "version": 2 }
+        payload = { "player_type": self.config["video-request"]["playerType"], "video_id": title.id, "quality": "max", "content_protection": "widevine", "tz": "-03:00", "version": 2 }
 
         cookies = self.session.cookies.get_dict()
         self.session.cookies.update(cookies)
         self.session.headers.update({
 			"authorization": f"Bearer {cookies['GLBID']}"
         })
-        program_data = self.session.post(
+        res = self.session.post(
 			url=self.config["endpoints"]["video-session"],
 			json=payload,
 			headers=self.headers
-		).json()
+		)
+        try:
+            res.raise_for_status()
+            program_data = res.json()
+        except (HTTPError, json.JSONDecodeError):
+            raise self.log.exit(f" - Failed to start video session: {res.text}")
 
         manifest_url=program_data["sources"][0]["url"]
         self.log.warning(f" + Downloading Manifest ---> {manifest_url}")
@@ -95,23 +186,24 @@ class Globoplay(BaseService):
             pass
         
         if manifest_url.find(".mpd")>=1:
-            return Tracks.from_mpd(
-                url=manifest_url,
-                session=self.session,
-                source=self.ALIASES[0]
-            )
+            with span("tracks.from_mpd"):
+                return Tracks.from_mpd(
+                    url=manifest_url,
+                    session=self.session,
+                    source=self.ALIASES[0]
+                )
         elif manifest_url.find(".ism")>=1:
-            return Tracks.from_ism(
-                url=manifest_url,
-                session=self.session,
-                source=self.ALIASES[0]
-            )
+            with span("tracks.from_ism"):
+                return Tracks.from_ism(
+                    url=manifest_url,
+                    session=self.session,
+                    source=self.ALIASES[0]
+                )
         else:
-            tracks = Tracks.from_m3u8(m3u8.load(manifest_url), source=self.ALIASES[0])
-            if self.acodec:
-                tracks.audios = [
-                    x for x in tracks.audios if (x.codec or "").split("-")[0] in self.AUDIO_CODEC_MAP[self.acodec]
-                ]
+            playlist = self.selection.prune_m3u8(self.manifests.load_m3u8(manifest_url))
+            with span("tracks.from_m3u8"):
+                tracks = Tracks.from_m3u8(playlist, source=self.ALIASES[0])
+            self.selection.filter_tracks(tracks)
             for video in tracks.videos:
                 # This is needed to remove weird glitchy NOP data at the end of stream
                 video.needs_repack = True
@@ -2,10 +2,67 @@ import json
 import click
 from vinetrimmer.objects import AudioTrack, TextTrack, Title, Tracks, VideoTrack
 from vinetrimmer.services.BaseService import BaseService
+from vinetrimmer.utils.cache_store import CacheStore, NullStore
+from vinetrimmer.utils.cassette import CASSETTE
 from vinetrimmer.utils.collections import as_list
-from datetime import datetime, timedelta
+from vinetrimmer.utils.concurrency import imap_ordered
+from vinetrimmer.utils.http_metrics import METRICS
+from vinetrimmer.utils.manifests import ManifestFetcher
+from vinetrimmer.utils.service_config import load_service_config
+from vinetrimmer.utils.session_layers import install_session_layers
+from vinetrimmer.utils.singleflight import SingleFlight
+from vinetrimmer.utils.subtitles import SubtitleCache
+from vinetrimmer.utils.track_selection import TrackSelection
+from vinetrimmer.utils.tracing import span, traced
+from datetime import timedelta
 from pathlib import Path
-import m3u8, re, os, pickle
+from requests import HTTPError
+from typing import NamedTuple, Optional
+import re
+
+class MeliEpisode(NamedTuple):
+    """Projection of a vcp payload, keeping only the fields used to build titles and tracks."""
+    content_id: str
+    title: str
+    secondary_title: Optional[str]
+    playback: dict
+    has_seasons: bool
+    season_ids: list
+    episode_ids: list
+
+
+class MeliPlayback:
+    """The parts of a playbackContext read by get_tracks, kept on the Title instead of the whole context."""
+    __slots__ = ("manifest_url", "subtitles", "widevine", "playready")
+
+    def __init__(self, manifest_url, subtitles=(), widevine=None, playready=None):
+        self.manifest_url = manifest_url
+        # (label, language, url) of each subtitle
+        self.subtitles = subtitles
+        # (license URL, auth token) per DRM system
+        self.widevine = widevine
+        self.playready = playready
+
+    @classmethod
+    def from_context(cls, context):
+        drm = context.get("drm") or {}
+
+        def license(system):
+            try:
+                return drm[system]["serverUrl"], drm[system]["httpRequestHeaders"]["x-dt-auth-token"]
+            except (KeyError, TypeError):
+                return None
+
+        return cls(
+            manifest_url=(context.get("sources") or {}).get("dash"),
+            subtitles=tuple(
+                (sub["label"], sub["lang"], sub["url"]) for sub in context.get("subtitles") or []
+                if not (sub.get("label") == "No" or sub.get("lang") == "disabled")
+            ),
+            widevine=license("widevine"),
+            playready=license("playready")
+        )
+
 
 class Meliplay(BaseService):
     """
@@ -33,15 +90,15 @@ class Meliplay(BaseService):
 		"com.uy": "UY",
 	}
 
-    AUDIO_CODEC_MAP = {
-        "AAC": "mp4a",
-        "AC3": "ac-3",
-        "EC3": "ec-3"
-    }
-    
     CACHE_DIR = Path(__file__).resolve().parent.parent / "Cache" / "MELI"
-    CACHE_FILE = CACHE_DIR / "video_requests.pkl"
+    CACHE_FILE = "video_requests_{region}.db"
     CACHE_EXPIRATION_DAYS = 1
+    # Bump when MeliEpisode changes, old cache entries are dropped on open
+    CACHE_SCHEMA_VERSION = 2
+    PLAYBACK_KEYS = ("sources", "subtitles", "drm")
+    
+    # One cache shard per region, opened once per process
+    cache_shards = {}
 
     @staticmethod
     @click.command(name="Meliplay", short_help="https://play.mercadolivre.com.br/")
@@ -50,22 +107,29 @@ class Meliplay(BaseService):
     @click.option("-as", "--all-seasons", is_flag=True, default=False, help="Get all episodes of the all seasons.")
     @click.option("--no-cache", is_flag=True, default=False,
 			  help="Disable the use of cached request.")
+    @click.option("--sync", is_flag=True, default=False,
+              help="Refresh season listings and only request episodes that aren't cached yet.")
    
     @click.pass_context
     def cli(ctx, **kwargs):
         return Meliplay(ctx, **kwargs)
 
-    def __init__(self, ctx, title, season, all_seasons, no_cache):
+    def __init__(self, ctx, title, season, all_seasons, no_cache, sync):
         super().__init__(ctx)
-        import yaml
-        #Read YAML file
-        with open("./vinetrimmer/config/Services/meliplay.yml", 'r') as stream:
-            self.config = yaml.safe_load(stream)
+        self.config = load_service_config("meliplay")
+        install_session_layers(self.session, "meliplay", self.config)
         
-        self.parse_title_meli(ctx, title)
+        with span("parse_title"):
+            self.parse_title_meli(ctx, title)
         self.season = season
         self.allseason = all_seasons
         self.nocache = no_cache
+        self.sync = sync
+        self.known_episodes = set()
+        # Shares concurrent lookups of the same episode, with or without --no-cache
+        self.flight = SingleFlight()
+        self.concurrency = max(1, int(self.config.get("concurrency", 1)))
+        self.selection = TrackSelection.from_context(ctx)
         
         config_region = self.config.get("region")
                 
@@ -75,6 +139,10 @@ class Meliplay(BaseService):
             self.region = config_region
         self.log.info(f" + Region: {self.region}")
         
+        # Recorded and replayed runs must not depend on, or write to, the on-disk cache
+        self.cache = NullStore() if CASSETTE.enabled else self.get_cache_shard(self.region)
+        self.season_cache_ttl = timedelta(hours=self.config.get("season_cache_hours", 6))
+        
         self.playready = True if "certificate_chain" in dir(ctx.obj.cdm) else False
         
         cookies = self.session.cookies.get_dict()
@@ -82,117 +150,126 @@ class Meliplay(BaseService):
         self.headers = {
             'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36'
         }
+        self.manifests = ManifestFetcher(
+            self.session, ttl=0 if CASSETTE.enabled else self.config.get("manifest_cache_seconds", 300)
+        )
+        
+        subtitle_cache = self.config.get("subtitle_cache") or {}
+        self.subtitle_cache = None
+        if subtitle_cache.get("enabled") and not CASSETTE.enabled:
+            self.subtitle_cache = SubtitleCache(self.session, self.headers, subtitle_cache.get("concurrency", 8))
         
+    @traced("Meliplay.get_titles")
     def get_titles(self):
-        res_list = []
+        return list(self.iter_titles())
         
-        title_req = self.get_episode(self.title)
+    def iter_titles(self):
+        """
+        Yield each Title as soon as its vcp payload arrives, in season/episode order.
+        Only `concurrency` requests are kept ahead of the consumer, so memory follows the
+        pipeline depth instead of the size of the show.
+        """
+        # On --sync the title payload is refreshed too, as it carries the current episode list
+        title_req = self.get_episode(self.title, refresh=self.sync)
         
-        if title_req.get("seasons-selector") and self.allseason:
-            seasons = self.get_seasons_id_from_episode(title_req)
-            
-            for season in seasons:
-                episodes_list = self.get_episodes_from_season(season)
-                
-                for episode in episodes_list:
-                    res_list.append(self.get_episode(episode))
-                
-        elif title_req.get("seasons-selector") and self.season:
-            episodes_list = self.get_episodes_id(title_req)
+        if title_req.has_seasons and self.allseason:
+            seasons = title_req.season_ids
+            episodes_list = (
+                episode for episodes in imap_ordered(self.get_episodes_from_season, seasons, self.concurrency)
+                for episode in episodes
+            )
             
-            for episode in episodes_list:
-                res_list.append(self.get_episode(episode))
+        elif title_req.has_seasons and self.season:
+            # Not synced against the season listings: the payload doesn't say which season
+            # these episodes belong to, and self.title is an episode ID, not a season ID
+            episodes_list = title_req.episode_ids
                 
-        elif (self.season or self.allseason) and not title_req.get("seasons-selector"):
+        elif (self.season or self.allseason) and not title_req.has_seasons:
             self.log.warning(f" + This title isn't a tv series, getting as a movie")
-            res_list.append(title_req)
+            yield self.get_title(title_req)
+            return
         else:
-            res_list.append(title_req)
             self.log.warning(f" + Add -s or --season after url or video id to get all episodes of the season")
             self.log.warning(f" + Add -as or --all-seasons after url or video id to get all episodes from all seasons")
+            yield self.get_title(title_req)
+            return
         
-        programs = list()
+        def episode(epi_id):
+            # The URL's episode shows up again in its season's list, it was already fetched
+            return title_req if epi_id == self.title else self.get_episode(epi_id)
         
-        for program in res_list:
-            try:
-                show_detail = program["player"]["ui"] 
-                video_detail = program["player"]["playbackContext"]
-                video_detail = program["player"]["playbackContext"]
-            except Exception:
-                raise self.log.exit("No manifest information.")
+        for program in imap_ordered(episode, episodes_list, self.concurrency):
+            yield self.get_title(program)
+        
+    def get_title(self, program):
+        secondaryTitle = program.secondary_title or "T0:E0"
             
-            try:
-                secondaryTitle = show_detail["secondaryTitle"]
-            except Exception:
-                secondaryTitle = "T0:E0"
-                
-            title_kwargs = {
-                "id_": program["player"]["contentId"],
-                "name": show_detail["title"],
-                "source": self.ALIASES[0],
-                "service_data": program["player"]["playbackContext"]
-            }
-                
-            seasonNumber = secondaryTitle.split(":")[0].strip().replace("T", "")
-            episodeNumber = secondaryTitle.split(":")[1].split()[0].strip().replace("E", "")
-              
-            if seasonNumber and seasonNumber != "0":
-                episodeName = secondaryTitle.split(":")[1].split("| ")[1].strip()
-                title_kwargs["type_"] = Title.Types.TV
-                title_kwargs["season"] = seasonNumber
-                title_kwargs["episode"] = episodeNumber
-                title_kwargs["episode_name"] = episodeName
-            else:
-                title_kwargs["type_"] = Title.Types.MOVIE
-                
-            programs += [Title(**title_kwargs)]
+        playback = MeliPlayback.from_context(program.playback)
+        if self.subtitle_cache:
+            # Fetched in the background while the rest of the titles are resolved
+            self.subtitle_cache.prefetch(url for _, _, url in self.selection.subtitles(playback.subtitles, lambda x: x[1]))
+        title_kwargs = {
+            "id_": program.content_id,
+            "name": program.title,
+            "source": self.ALIASES[0],
+            "service_data": playback
+        }
+            
+        seasonNumber = secondaryTitle.split(":")[0].strip().replace("T", "")
+        episodeNumber = secondaryTitle.split(":")[1].split()[0].strip().replace("E", "")
+          
+        if seasonNumber and seasonNumber != "0":
+            episodeName = secondaryTitle.split(":")[1].split("| ")[1].strip()
+            title_kwargs["type_"] = Title.Types.TV
+            title_kwargs["season"] = seasonNumber
+            title_kwargs["episode"] = episodeNumber
+            title_kwargs["episode_name"] = episodeName
+        else:
+            title_kwargs["type_"] = Title.Types.MOVIE
             
-        return programs
+        return Title(**title_kwargs)
         
+    @traced("Meliplay.get_tracks")
     def get_tracks(self, title):
         vd = title.service_data
-        self.manifest_url = vd["sources"]["dash"]
-        self.subtitles = vd["subtitles"]
+        self.manifest_url = vd.manifest_url
+        self.subtitles = vd.subtitles
+        if not self.manifest_url:
+            raise self.log.exit(f" - No manifest found for {title.id}")
         
-        try:
-            if self.playready:
-                self.lic_url = vd["drm"]["playready"]["serverUrl"]
-                self.auth_token = vd["drm"]["playready"]["httpRequestHeaders"]["x-dt-auth-token"]
-            else:
-                self.lic_url = vd["drm"]["widevine"]["serverUrl"]
-                self.auth_token = vd["drm"]["widevine"]["httpRequestHeaders"]["x-dt-auth-token"]
-        except:
-            pass
+        drm = vd.playready if self.playready else vd.widevine
+        if drm:
+            self.lic_url, self.auth_token = drm
 
         self.log.debug(f" + Downloading Manifest ---> {self.manifest_url}")
         
         if self.manifest_url.find(".m3u8")==-1:
-            tracks = Tracks.from_mpd(
-                url=self.manifest_url,
-                session=self.session,
-                source=self.ALIASES[0]
-            )
+            with span("tracks.from_mpd"):
+                tracks = Tracks.from_mpd(
+                    url=self.manifest_url,
+                    session=self.session,
+                    source=self.ALIASES[0]
+                )
         else:
-            tracks = Tracks.from_m3u8(m3u8.load(self.manifest_url), source=self.ALIASES[0])
-            if self.acodec:
-                tracks.audios = [
-                    x for x in tracks.audios if (x.codec or "").split("-")[0] in self.AUDIO_CODEC_MAP[self.acodec]
-                ]
+            playlist = self.selection.prune_m3u8(self.manifests.load_m3u8(self.manifest_url))
+            with span("tracks.from_m3u8"):
+                tracks = Tracks.from_m3u8(playlist, source=self.ALIASES[0])
+            self.selection.filter_tracks(tracks)
             for video in tracks.videos:
                 # This is needed to remove weird glitchy NOP data at the end of stream
                 video.needs_repack = True
         
-        for sub in self.subtitles:
-            if sub.get("label") == "No" or sub.get("lang") == "disabled":
-                continue
-            else:
-                tracks.add(TextTrack(
-                    id_=sub["label"],
-                    source=self.ALIASES[0],
-                    url=sub["url"],
-                    codec="vtt",
-                    language=sub["lang"],
-                ), warn_only=True)
+        for label, lang, url in self.selection.subtitles(self.subtitles, lambda x: x[1]):
+            if self.subtitle_cache:
+                path = self.subtitle_cache.get(url)
+                url = path.as_uri() if path else url
+            tracks.add(TextTrack(
+                id_=label,
+                source=self.ALIASES[0],
+                url=url,
+                codec="vtt",
+                language=lang,
+            ), warn_only=True)
         
         return tracks
 
@@ -230,18 +307,49 @@ class Meliplay(BaseService):
         return season_list
                 
     def get_episodes_from_season(self, sea_id):
+        cache_key = self.cache_key("seasons", sea_id)
+        if not self.nocache and not self.sync:
+            cached, state = self.cache.lookup(cache_key)
+            METRICS.cache("meliplay-seasons", state)
+            if cached is not None:
+                self.log.warning(f" + Getting season {sea_id} cached listing")
+                return cached
+        
         episode_list = []
-        api = f"{self.config["endpoints"][self.region]}/episodes"
-        response = self.session.get(
+        api = f"{self.config['endpoints'][self.region]}/episodes"
+        res = self.session.get(
                   api.format(req_type="seasons", title_id=sea_id),
                       headers=self.headers
-                  ).json()["props"]["components"]
+                  )
+        try:
+            res.raise_for_status()
+            response = res.json()["props"]["components"]
+        except (HTTPError, json.JSONDecodeError, KeyError):
+            raise self.log.exit(f" - Failed to load season {sea_id}: {res.text}")
                   
         for item in response:
             episode_list.append(item["props"]["contentId"])
+        
+        if self.sync:
+            self.sync_listing(sea_id, episode_list)
+        else:
+            self.cache.set(cache_key, episode_list, ttl=self.season_cache_ttl)
                           
         return episode_list
     
+    def sync_listing(self, sea_id, episode_list):
+        """
+        Diff a fresh episode listing against the cached one. Episodes already listed before
+        are served from cache even when expired, so only new episodes are requested.
+        """
+        cache_key = self.cache_key("seasons", sea_id)
+        previous = set(self.cache.get(cache_key, [], stale=True))
+        self.known_episodes.update(x for x in episode_list if x in previous)
+        new_episodes = [x for x in episode_list if x not in previous]
+        self.log.info(f" + Season {sea_id}: {len(new_episodes)} new episode(s)")
+        self.cache.set(cache_key, episode_list, ttl=self.season_cache_ttl)
+        return new_episodes
+    
     def get_episodes_id(self, api_res):
         episode_list = []
         episodes = api_res["seasons-selector"]["carousel"]["props"]["components"]
@@ -251,19 +359,16 @@ class Meliplay(BaseService):
             
         return episode_list
     
-    def get_episode(self, epi_id):
-        cache = self.load_cache()
-        
-        if (self.season or self.allseason) and not self.nocache:
-            if epi_id in cache:
+    def get_episode(self, epi_id, refresh=False):
+        return self.flight.do(("vcp", epi_id), self.fetch_episode, epi_id, refresh)
+    
+    def fetch_episode(self, epi_id, refresh=False):
+        if (self.season or self.allseason) and not self.nocache and not refresh:
+            cached, state = self.cache.lookup(self.cache_key("vcp", epi_id), stale=epi_id in self.known_episodes)
+            METRICS.cache("meliplay", state)
+            if cached is not None:
                 self.log.warning(f" + Getting {epi_id} cached request")
-                cached = cache[epi_id]
-                if "timestamp" in cached and not self.is_expired(cached["timestamp"]):
-                    return cached["data"]
-                else:
-                    self.log.warning(f" + {epi_id} cached request is old. Getting new")
-                    del cache[epi_id]
-                    save_cache(cache)
+                return MeliEpisode(*cached)
         
         api = self.config["endpoints"][self.region]
         
@@ -274,43 +379,49 @@ class Meliplay(BaseService):
             )
                 
             response.raise_for_status()
-            data = response.json()["components"]
-        except (json.JSONDecodeError, KeyError) as e:
+            data = self.project_episode(response.json()["components"])
+        except (HTTPError, json.JSONDecodeError, KeyError) as e:
             raise self.log.exit(f" - Failed to load title manifest: {response.text}")
             
-        cache[epi_id] = {
-            "data": data,
-            "timestamp": datetime.now().isoformat()
-        }
-        self.save_cache(cache)
+        # Stored as a plain tuple, so entries don't depend on the MeliEpisode class path
+        self.cache.set(self.cache_key("vcp", epi_id), tuple(data))
         return data
-            
-    def load_cache(self):
-        os.makedirs(self.CACHE_DIR, exist_ok=True)
-        if os.path.exists(self.CACHE_FILE):
-            try:
-                with open(self.CACHE_FILE, "rb") as f:
-                    return pickle.load(f)
-            except Exception as e:
-                self.log.warning("+ Error loading requests cache. Deleting corrupted cache.")
-                try:
-                    self.CACHE_FILE.unlink()
-                except Exception as del_err:
-                    raise self.log.exit("+ Unable to clear corrupt requests cache.")
-                return {}
-        return {}
-        
-    def save_cache(self, cache):
-        with open(self.CACHE_FILE, "wb") as f:
-            pickle.dump(cache, f)
-            
-    def is_expired(self, timestamp_str):
+    
+    def project_episode(self, components):
         try:
-            timestamp = datetime.fromisoformat(timestamp_str)
-            return datetime.now() - timestamp > timedelta(days=self.CACHE_EXPIRATION_DAYS)
-        except:
-            return True
+            player = components["player"]
+            show_detail = player["ui"]
+            video_detail = player["playbackContext"]
+        except Exception:
+            raise self.log.exit("No manifest information.")
+        
+        has_seasons = bool(components.get("seasons-selector"))
+        return MeliEpisode(
+            content_id=player["contentId"],
+            title=show_detail["title"],
+            secondary_title=show_detail.get("secondaryTitle"),
+            playback={k: video_detail[k] for k in self.PLAYBACK_KEYS if k in video_detail},
+            has_seasons=has_seasons,
+            season_ids=self.get_seasons_id_from_episode(components) if has_seasons else [],
+            episode_ids=self.get_episodes_id(components) if has_seasons else []
+        )
             
+    def get_cache_shard(self, region):
+        shard = self.cache_shards.get(region)
+        if shard is None:
+            shard = self.cache_shards[region] = CacheStore(
+                self.CACHE_DIR / self.CACHE_FILE.format(region=region),
+                ttl=timedelta(days=self.CACHE_EXPIRATION_DAYS),
+                max_entries=self.config.get("cache_max_entries"),
+                stale_retention=timedelta(days=self.config.get("cache_stale_days", 30)),
+                schema=self.CACHE_SCHEMA_VERSION,
+                compress=self.config.get("cache_compress", True)
+            )
+        return shard
+    
+    def cache_key(self, req_type, title_id):
+        return f"{self.region}:{req_type}:{title_id}"
+    
     def parse_title_meli(self, ctx, title):
         title = title or ctx.parent.params.get("title")
         if not title:
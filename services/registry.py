@@ -0,0 +1,106 @@
+"""
+Lazy registry for the services in this repository.
+
+Aliases and hosts are kept in a static manifest, so finding the service for an alias or
+URL doesn't import anything. A service module (and its dependencies) is only imported
+when its class is requested.
+"""
+import importlib
+import re
+import threading
+from urllib.parse import urlparse
+
+from vinetrimmer.utils.collections import as_list
+
+MANIFEST = {
+    "Batch": {
+        "module": "vinetrimmer.services.batch",
+        "aliases": ["BATCH"],
+        "hosts": [],
+    },
+    "Daemon": {
+        "module": "vinetrimmer.services.daemon",
+        "aliases": ["DAEMON"],
+        "hosts": [],
+    },
+    "F1tv": {
+        "module": "vinetrimmer.services.f1tv",
+        "aliases": ["F1TV", "F1"],
+        "hosts": ["f1tv.formula1.com"],
+    },
+    "Globoplay": {
+        "module": "vinetrimmer.services.globoplay",
+        "aliases": ["GLB", "Globo", "Globoplay"],
+        "hosts": ["globoplay.globo.com"],
+    },
+    "Meliplay": {
+        "module": "vinetrimmer.services.meliplay",
+        "aliases": ["MELI", "MELIPLAY", "MLPLAY"],
+        "hosts": [
+            "play.mercadolibre.com.ar",
+            "play.mercadolivre.com.br",
+            "play.mercadolibre.cl",
+            "play.mercadolibre.com.co",
+            "play.mercadolibre.com.ec",
+            "play.mercadolibre.com.mx",
+            "play.mercadolibre.com.pe",
+            "play.mercadolibre.com.uy",
+        ],
+    },
+}
+
+# Same shape as vinetrimmer's SERVICE_MAP, so both can be merged
+SERVICE_MAP = {name: service["aliases"] for name, service in MANIFEST.items()}
+
+ALIAS_INDEX = {alias.lower(): name for name, aliases in SERVICE_MAP.items() for alias in aliases + [name]}
+HOST_INDEX = {host: name for name, service in MANIFEST.items() for host in service["hosts"]}
+
+_classes = {}
+_patterns = {}
+_lock = threading.Lock()
+
+
+def get_service_key(value):
+    """Return the service name for an alias, a service name or a title URL, or None."""
+    name = ALIAS_INDEX.get(value.lower())
+    if name:
+        return name
+    host = urlparse(value).hostname
+    if host:
+        return HOST_INDEX.get(host.lower()) or HOST_INDEX.get(host.lower().removeprefix("www."))
+    return None
+
+
+def load_service(name):
+    """Import the service module on first use and return its class."""
+    cls = _classes.get(name)
+    if cls is None:
+        with _lock:
+            cls = _classes.get(name)
+            if cls is None:
+                module = importlib.import_module(MANIFEST[name]["module"])
+                cls = _classes[name] = getattr(module, name)
+    return cls
+
+
+def title_patterns(name):
+    """The service's TITLE_RE, compiled once per process."""
+    patterns = _patterns.get(name)
+    if patterns is None:
+        patterns = _patterns[name] = [re.compile(x) for x in as_list(load_service(name).TITLE_RE)]
+    return patterns
+
+
+def match_title(value, name=None):
+    """
+    Dispatch a URL or ID to its service and match it against that service's TITLE_RE.
+    Returns (service name, groupdict), with an empty groupdict when nothing matched.
+    """
+    name = name or get_service_key(value)
+    if not name:
+        return None, {}
+    for pattern in title_patterns(name):
+        m = pattern.search(value)
+        if m:
+            return name, m.groupdict()
+    return name, {}
@@ -0,0 +1,34 @@
+import sqlite3
+import time
+
+from vinetrimmer.utils.cache_store import CacheStore
+
+
+def test_lookup_does_not_wait_on_writers(tmp_path):
+    store = CacheStore(tmp_path / "cache.db", compact_interval=0)
+    store.set("a", 1)
+
+    writer = sqlite3.connect(tmp_path / "cache.db", isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        start = time.perf_counter()
+        assert store.get("a") == 1
+        assert time.perf_counter() - start < 1
+    finally:
+        writer.execute("COMMIT")
+        writer.close()
+    store.close()
+
+
+def test_reads_keep_lru_position(tmp_path):
+    store = CacheStore(tmp_path / "cache.db", max_entries=2, compact_interval=0)
+    store.set("a", 1)
+    store.set("b", 2)
+    assert store.get("a") == 1
+    store.set("c", 3)
+    store.compact()
+
+    assert "a" in store
+    assert "b" not in store
+    assert "c" in store
+    store.close()
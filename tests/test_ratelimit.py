@@ -0,0 +1,63 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+from requests.exceptions import TooManyRedirects
+
+from vinetrimmer.utils import ratelimit
+from vinetrimmer.utils.ratelimit import RateLimiter
+
+
+def request(method="GET"):
+    return SimpleNamespace(url="https://ratelimit.invalid/path", method=method)
+
+
+def response(status):
+    return SimpleNamespace(status_code=status, headers={}, close=lambda: None)
+
+
+@pytest.fixture(autouse=True)
+def clear_hosts():
+    ratelimit._hosts.clear()
+    yield
+    ratelimit._hosts.clear()
+
+
+def test_slot_released_on_unexpected_error():
+    limiter = RateLimiter(max_concurrency=2, backoff=0.001)
+
+    def redirect_loop(req, **kwargs):
+        raise TooManyRedirects("Exceeded 30 redirects.")
+
+    for _ in range(2):
+        with pytest.raises(TooManyRedirects):
+            limiter.send(redirect_loop, request())
+
+    # With leaked slots this would wait forever
+    result = []
+    thread = threading.Thread(
+        target=lambda: result.append(limiter.send(lambda req, **kw: response(200), request())),
+        daemon=True
+    )
+    thread.start()
+    thread.join(5)
+    assert result and result[0].status_code == 200
+    assert ratelimit._hosts["ratelimit.invalid"].concurrency.in_flight == 0
+
+
+def test_post_retried_on_503():
+    statuses = iter([503, 503, 200])
+    res = RateLimiter(backoff=0.001).send(lambda req, **kw: response(next(statuses)), request("POST"))
+    assert res.status_code == 200
+    assert res.retries == 2
+
+
+def test_post_not_retried_on_500():
+    calls = []
+
+    def send(req, **kwargs):
+        calls.append(req)
+        return response(500)
+
+    assert RateLimiter(backoff=0.001).send(send, request("POST")).status_code == 500
+    assert len(calls) == 1
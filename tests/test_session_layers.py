@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+
+import pytest
+
+from vinetrimmer.utils import ratelimit
+from vinetrimmer.utils.http_metrics import METRICS, endpoint_template
+from vinetrimmer.utils.session_layers import install_session_layers
+
+URL = "https://layers.invalid/api/title"
+
+
+@pytest.fixture(autouse=True)
+def clear_state():
+    ratelimit._hosts.clear()
+    METRICS.endpoints.clear()
+    yield
+    ratelimit._hosts.clear()
+    METRICS.endpoints.clear()
+
+
+def test_metrics_see_retried_request_once():
+    statuses = iter([503, 200])
+    session = SimpleNamespace(
+        send=lambda req, **kw: SimpleNamespace(status_code=next(statuses), headers={}, content=b"", close=lambda: None)
+    )
+    install_session_layers(session, "layers", {"rate_limit": {"backoff": 0.001}, "http_cache": {"enabled": False}})
+
+    assert session.send(SimpleNamespace(url=URL, method="GET", headers={})).status_code == 200
+    stats = METRICS.endpoints[endpoint_template("GET", URL)]
+    assert stats.count == 1
+    assert stats.retries == 1
@@ -0,0 +1,37 @@
+from vinetrimmer.utils.subtitles import normalize_vtt
+
+VTT = (
+    "\ufeffWEBVTT\r\n\r\n"
+    "1\r\n00:00:01,000 --> 00:00:02,500\r\nHello\r\nWorld  \r\n\r\n\r\n"
+    "2\r\n00:00:03.000 --> 00:00:04.000 align:start\r\nOlá, ação\r\n"
+).encode("utf-8")
+
+EXPECTED = (
+    "WEBVTT\n\n"
+    "1\n00:00:01.000 --> 00:00:02.500\nHello\nWorld\n\n"
+    "2\n00:00:03.000 --> 00:00:04.000 align:start\nOlá, ação\n"
+)
+
+
+def normalize(chunks):
+    return "".join(normalize_vtt(chunks))
+
+
+def test_normalize_vtt():
+    assert normalize([VTT]) == EXPECTED
+
+
+def test_normalize_vtt_chunk_boundaries():
+    # Every split point, including inside a \r\n and inside a multi-byte character
+    for i in range(len(VTT) + 1):
+        assert normalize([VTT[:i], VTT[i:]]) == EXPECTED, f"split at byte {i}"
+
+
+def test_normalize_vtt_split_crlf_keeps_cue():
+    assert normalize([b"WEBVTT\r\n\r\n00:00:01.000 --> 00:00:02.000\r\nHello\r", b"\nWorld"]) == (
+        "WEBVTT\n\n00:00:01.000 --> 00:00:02.000\nHello\nWorld\n"
+    )
+
+
+def test_normalize_vtt_byte_by_byte():
+    assert normalize(VTT[i:i + 1] for i in range(len(VTT))) == EXPECTED
@@ -0,0 +1,233 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import nullcontext
+from datetime import timedelta
+from pathlib import Path
+
+from vinetrimmer.utils.tracing import span
+
+
+class CacheStore:
+    """
+    Indexed on-disk key/value cache backed by SQLite.
+
+    Entries are read and written one at a time, so a lookup or an update never has to
+    load the whole cache. Every entry carries its own expiry, reads refresh its LRU
+    position and a background thread periodically drops expired entries, evicts the
+    least recently used ones above `max_entries` and gives the freed pages back. Reads
+    never write: LRU positions are batched in memory and saved by that thread.
+
+    The database runs in WAL mode with a busy timeout, so several vinetrimmer processes
+    can share one store: every write is its own atomic transaction and concurrent
+    writers wait on SQLite's lock instead of overwriting each other's entries.
+
+    Expired entries are kept for `stale_retention` more seconds, so callers that know
+    an entry is still valid (e.g. an incremental sync) can read it with `stale=True`.
+
+    Values are pickled and, with `compress`, zlib compressed. Opening a store with a
+    different `schema` than the one it was written with drops every entry.
+    """
+
+    BUSY_TIMEOUT = 30
+
+    def __init__(self, path, ttl=None, max_entries=None, stale_retention=0, schema=0, compress=False,
+                 compact_interval=300):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = self._seconds(ttl)
+        self.max_entries = max_entries
+        self.stale_retention = self._seconds(stale_retention) or 0
+        self.schema = schema
+        self.compress = compress
+
+        self._lock = threading.RLock()
+        # Keys read since the last compaction and when, saved as LRU positions in batches
+        self._touched = {}
+        self._touched_lock = threading.Lock()
+        self._db = self._open()
+        self._closed = threading.Event()
+        self._compactor = None
+        if compact_interval:
+            self._compactor = threading.Thread(
+                target=self._compact_loop,
+                args=(compact_interval,),
+                name=f"CacheStore({self.path.name})",
+                daemon=True
+            )
+            self._compactor.start()
+
+    def _connect(self):
+        db = sqlite3.connect(
+            self.path,
+            timeout=self.BUSY_TIMEOUT,
+            check_same_thread=False,
+            isolation_level=None
+        )
+        try:
+            db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            db.execute("PRAGMA journal_mode = WAL")
+            db.execute("PRAGMA synchronous = NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL, accessed REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            if db.execute("PRAGMA user_version").fetchone()[0] != self.schema:
+                db.execute("BEGIN IMMEDIATE")
+                if db.execute("PRAGMA user_version").fetchone()[0] != self.schema:
+                    db.execute("DELETE FROM entries")
+                    db.execute(f"PRAGMA user_version = {int(self.schema)}")
+                db.execute("COMMIT")
+        except Exception:
+            db.close()
+            raise
+        return db
+
+    def _open(self):
+        try:
+            return self._connect()
+        except sqlite3.OperationalError:
+            raise
+        except sqlite3.DatabaseError:
+            # Not a database (e.g. a truncated file): move it aside atomically so other
+            # processes never see a half-deleted file, then start a new one.
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.corrupt"))
+            return self._connect()
+
+    @staticmethod
+    def _seconds(ttl):
+        if isinstance(ttl, timedelta):
+            return ttl.total_seconds()
+        return ttl
+
+    def get(self, key, default=None, stale=False):
+        value, state = self.lookup(key, stale)
+        return default if state == "miss" else value
+
+    def lookup(self, key, stale=False):
+        """Like `get`, but returns (value, state) with state being "hit", "stale" or "miss"."""
+        now = time.time()
+        with span("cache.lookup"), self._lock:
+            row = self._db.execute("SELECT value, expires FROM entries WHERE key = ?", (key,)).fetchone()
+            if not row:
+                return None, "miss"
+            value, expires = row
+            expired = expires is not None and expires <= now
+            if expired and not stale:
+                return None, "miss"
+        # A hit never waits on writers, its LRU position is saved by the next compaction
+        with self._touched_lock:
+            self._touched[key] = now
+        return self._loads(value), "stale" if expired else "hit"
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        ttl = self._seconds(ttl) if ttl is not None else self.ttl
+        expires = now + ttl if ttl is not None else None
+        with span("cache.save"):
+            blob = self._dumps(value)
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                    (key, blob, expires, now)
+                )
+
+    def _dumps(self, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if self.compress:
+            return b"z" + zlib.compress(blob)
+        return b"p" + blob
+
+    @staticmethod
+    def _loads(blob):
+        if blob[:1] == b"z":
+            return pickle.loads(zlib.decompress(blob[1:]))
+        return pickle.loads(blob[1:])
+
+    def delete(self, key):
+        with self._lock:
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def compact(self, db=None):
+        """Drop expired entries, evict LRU entries above `max_entries` and release free pages."""
+        db = db or self._db
+        with self._lock if db is self._db else nullcontext():
+            self._save_touched(db)
+            db.execute(
+                "DELETE FROM entries WHERE expires IS NOT NULL AND expires <= ?",
+                (time.time() - self.stale_retention,)
+            )
+            if self.max_entries:
+                db.execute(
+                    "DELETE FROM entries WHERE key IN "
+                    "(SELECT key FROM entries ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            db.execute("PRAGMA incremental_vacuum")
+
+    def _save_touched(self, db):
+        with self._touched_lock:
+            touched, self._touched = self._touched, {}
+        if not touched:
+            return
+        try:
+            db.executemany("UPDATE entries SET accessed = ? WHERE key = ?", [(t, k) for k, t in touched.items()])
+        except sqlite3.OperationalError:
+            # Best effort, only these LRU positions are lost
+            pass
+
+    def _compact_loop(self, interval):
+        db = sqlite3.connect(self.path, timeout=self.BUSY_TIMEOUT, isolation_level=None)
+        try:
+            while not self._closed.is_set():
+                try:
+                    self.compact(db)
+                except sqlite3.Error:
+                    pass
+                self._closed.wait(interval)
+        finally:
+            db.close()
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            # Don't wait on another process's write lock just to save LRU positions
+            self._db.execute("PRAGMA busy_timeout = 0")
+            self._save_touched(self._db)
+            self._db.close()
+
+
+class NullStore:
+    """A CacheStore that keeps nothing, for runs that must neither read nor write the on-disk caches."""
+
+    def get(self, key, default=None, stale=False):
+        return default
+
+    def lookup(self, key, stale=False):
+        return None, "miss"
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def __contains__(self, key):
+        return False
+
+    def __len__(self):
+        return 0
+
+    def close(self):
+        pass
@@ -0,0 +1,233 @@
+"""
+Record/replay of a service session's HTTP traffic.
+
+Set `VT_CASSETTE` to a file path and `VT_CASSETTE_MODE` to `record` to save every
+request made through the service sessions of a run, or to `replay` (default) to answer
+them from that file without touching the network. `VT_CASSETTE_TIMING` picks whether
+replayed responses take as long as when recorded (`original`) or return at once (`none`,
+default).
+
+Cassettes are gzipped JSON. Response bodies are stored once per content hash, cookies
+and auth headers aren't stored, and tokens in URLs, JSON fields and playlists are
+replaced, so a cassette can be shared. Requests that aren't in the cassette are
+answered with a 599 and listed when the run ends.
+
+While a cassette is in use, the services bypass their on-disk caches (HTTP, manifest,
+Meli Play and F1TV feed caches, and the subtitle cache), so what is recorded and
+replayed doesn't depend on the local cache state, and replayed data is never stored.
+"""
+import atexit
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from pathlib import Path
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from vinetrimmer.utils.http_metrics import METRICS
+from vinetrimmer.utils.manifests import normalize_manifest_url
+
+VERSION = 1
+
+# Request headers are never stored; these response headers aren't either
+SKIP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "set-cookie"}
+
+SECRET = re.compile(r"token|auth|secret|passw|cookie|signature|glbid|hdnt|hdnea|^sig$|^key-pair-id$|^policy$", re.I)
+SECRET_PARAM = re.compile(
+    r"([?&](?:[^=&\s\"']*(?:token|auth|secret|signature)[^=&\s\"']*|sig|hdnts|hdnea|policy|key-pair-id)=)[^&\s\"'#]+",
+    re.I
+)
+SCRUBBED = "SCRUBBED"
+
+log = logging.getLogger("cassette")
+
+
+def scrub_text(text):
+    return SECRET_PARAM.sub(rf"\1{SCRUBBED}", text)
+
+
+def scrub_json(value):
+    if isinstance(value, dict):
+        return {
+            k: SCRUBBED if SECRET.search(k) and isinstance(v, (str, int)) else scrub_json(v)
+            for k, v in value.items()
+        }
+    if isinstance(value, list):
+        return [scrub_json(x) for x in value]
+    if isinstance(value, str):
+        return scrub_text(value)
+    return value
+
+
+def scrub_body(content):
+    try:
+        text = content.decode("utf-8")
+    except UnicodeDecodeError:
+        return content
+    try:
+        return json.dumps(scrub_json(json.loads(text))).encode("utf-8")
+    except ValueError:
+        return scrub_text(text).encode("utf-8")
+
+
+def request_key(method, url):
+    return f"{method} {normalize_manifest_url(scrub_text(url))}"
+
+
+def body_digest(body):
+    if not body:
+        return None
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return hashlib.sha256(body).hexdigest()[:16]
+
+
+class Cassette:
+    def __init__(self, path=None, mode="replay", timing="none"):
+        self.path = Path(path) if path else None
+        # Services skip their persistent caches while a cassette is used
+        self.enabled = self.path is not None
+        self.mode = mode
+        self.timing = timing
+        self.lock = threading.Lock()
+        self.interactions = []
+        self.blobs = {}
+        # Replay position per request key, so repeated requests get their responses in order
+        self.position = defaultdict(int)
+        self.index = defaultdict(list)
+        self.unmatched = []
+        self.registered = False
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.environ.get("VT_CASSETTE"),
+            os.environ.get("VT_CASSETTE_MODE", "replay"),
+            os.environ.get("VT_CASSETTE_TIMING", "none")
+        )
+
+    def install(self, session):
+        if not self.path:
+            return session
+        with self.lock:
+            if self.mode == "replay" and not self.index:
+                self.load()
+        send = session.send
+
+        def cassette_send(request, **kwargs):
+            if self.mode == "record":
+                return self.record(send, request, **kwargs)
+            return self.replay(request)
+
+        session.send = cassette_send
+        if not self.registered:
+            self.registered = True
+            atexit.register(self.save if self.mode == "record" else self.report_unmatched)
+        return session
+
+    def record(self, send, request, **kwargs):
+        start = time.perf_counter()
+        response = send(request, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        content = scrub_body(response.content or b"")
+        digest = hashlib.sha256(content).hexdigest()
+        with self.lock:
+            self.blobs.setdefault(digest, base64.b64encode(content).decode("ascii"))
+            self.interactions.append({
+                "request": request_key(request.method, request.url),
+                "body": body_digest(request.body),
+                "status": response.status_code,
+                "reason": response.reason,
+                "url": scrub_text(response.url or request.url),
+                "headers": {
+                    k: v for k, v in response.headers.items()
+                    if k.lower() not in SKIP_HEADERS and not SECRET.search(k)
+                },
+                "content": digest,
+                "elapsed": round(elapsed, 6),
+            })
+        return response
+
+    def replay(self, request):
+        key = request_key(request.method, request.url)
+        with self.lock:
+            entry = self.match(key, body_digest(request.body))
+            if entry is None:
+                self.unmatched.append(key)
+        METRICS.cache("cassette", "miss" if entry is None else "hit")
+
+        if entry is None:
+            log.warning(f" - Not in cassette: {key}")
+            return self.build(request, {
+                "status": 599, "reason": "Not In Cassette", "url": request.url,
+                "headers": {"X-Cassette": "miss"}, "content": None, "elapsed": 0,
+            })
+        if self.timing == "original":
+            time.sleep(entry["elapsed"])
+        return self.build(request, entry)
+
+    def match(self, key, digest):
+        """
+        Next recorded response for this request, preferring one whose request body is
+        the same. Once they are used up, the last one is served again.
+        """
+        entries = self.index.get(key)
+        if not entries:
+            return None
+        start = self.position[key]
+        remaining = entries[start:] or entries[-1:]
+        entry = next((x for x in remaining if x["body"] == digest), remaining[0])
+        self.position[key] = max(start, entries.index(entry) + 1)
+        return entry
+
+    def build(self, request, entry):
+        response = Response()
+        response.status_code = entry["status"]
+        response.reason = entry["reason"]
+        response.url = request.url
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = base64.b64decode(self.blobs[entry["content"]]) if entry["content"] else b""
+        response.request = request
+        response.elapsed = timedelta(seconds=entry["elapsed"])
+        response.from_cassette = True
+        return response
+
+    def load(self):
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != VERSION:
+            raise ValueError(f"Unsupported cassette version {data.get('version')!r}: {self.path}")
+        self.interactions = data["interactions"]
+        self.blobs = data["blobs"]
+        for entry in self.interactions:
+            self.index[entry["request"]].append(entry)
+
+    def save(self):
+        with self.lock:
+            data = {"version": VERSION, "interactions": self.interactions, "blobs": self.blobs}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with gzip.open(temp, "wt", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(temp, self.path)
+
+    def report_unmatched(self):
+        if self.unmatched:
+            log.warning(f" - {len(self.unmatched)} request(s) weren't in cassette {self.path}:")
+            for key in sorted(set(self.unmatched)):
+                log.warning(f"   {key}")
+
+
+CASSETTE = Cassette.from_env()
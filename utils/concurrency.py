@@ -0,0 +1,26 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def imap_ordered(fn, iterable, workers, window=None):
+    """
+    Lazy, order-preserving version of `Executor.map`.
+
+    At most `window` calls (twice the worker count by default) are in flight or waiting
+    to be consumed at any time, so results are yielded as soon as the next one in input
+    order is ready and memory stays proportional to the pipeline depth instead of to the
+    size of `iterable`.
+    """
+    window = max(1, window or workers * 2)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            for item in iterable:
+                pending.append(pool.submit(fn, item))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,82 @@
+"""
+Thin client for the DAEMON service (`vt dl DAEMON`).
+
+Sends one Batch line (an URL, or an alias and ID, with the service's flags) or the
+lines of a file to the running daemon and prints the resolved titles as JSON. Only the
+standard library is imported, so a call costs little more than the interpreter start.
+
+    python vinetrimmer/utils/daemon_client.py MELI -as https://play.mercadolivre.com.br/assistir/piloto/a61052a39bc44bdf8854b2cc3d1668a8
+    python vinetrimmer/utils/daemon_client.py --file jobs.txt
+    python vinetrimmer/utils/daemon_client.py --metrics prometheus
+    python vinetrimmer/utils/daemon_client.py --stop
+
+Exits with 2 when no daemon is running, so a wrapper can fall back to `vt dl`.
+"""
+import argparse
+import json
+import shlex
+import socket
+import sys
+from pathlib import Path
+
+STATE_FILE = Path(__file__).resolve().parent.parent / "Cache" / "daemon.json"
+
+
+class DaemonUnavailable(Exception):
+    pass
+
+
+def call(job, timeout=600, **kwargs):
+    try:
+        state = json.loads(STATE_FILE.read_text(encoding="utf-8"))
+        conn = socket.create_connection(("127.0.0.1", state["port"]), timeout=timeout)
+    except (OSError, ValueError, KeyError) as e:
+        raise DaemonUnavailable(f"No daemon running ({e}), start one with `vt dl DAEMON`")
+    with conn, conn.makefile("rwb") as f:
+        f.write(json.dumps({"token": state["token"], "job": job, **kwargs}).encode("utf-8") + b"\n")
+        f.flush()
+        line = f.readline()
+    if not line:
+        raise DaemonUnavailable("The daemon closed the connection")
+    return json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("line", nargs=argparse.REMAINDER, help="an URL or alias and ID, with the service's flags")
+    parser.add_argument("--file", help="resolve every line of a Batch file")
+    parser.add_argument("--ping", action="store_true")
+    parser.add_argument("--metrics", nargs="?", const="json", choices=["json", "prometheus"],
+                        help="print the daemon's HTTP metrics so far")
+    parser.add_argument("--stop", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        if args.ping or args.stop:
+            response = call("stop" if args.stop else "ping")
+        elif args.metrics:
+            response = call("metrics", format=args.metrics)
+            if response.get("prometheus"):
+                print(response["prometheus"], end="")
+                return 0
+        else:
+            if args.file:
+                with open(args.file, "r", encoding="utf-8") as f:
+                    lines = f.read().splitlines()
+            elif args.line:
+                lines = [shlex.join(args.line)]
+            else:
+                parser.error("a title line or --file is required")
+            response = call("resolve", lines=lines)
+    except DaemonUnavailable as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    print(json.dumps(response, indent=2, ensure_ascii=False))
+    if not response.get("ok"):
+        return 1
+    return 1 if any("error" in x for x in response.get("results", [])) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+import hashlib
+import re
+from http.cookies import SimpleCookie
+import threading
+import time
+from datetime import timedelta
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from vinetrimmer.utils.cache_store import CacheStore
+
+CACHE_DIR = Path(__file__).resolve().parent.parent / "Cache" / "http"
+
+# Entries are kept this long after they stop being fresh, to be revalidated with a conditional GET
+RETENTION = timedelta(days=30)
+
+# Headers dropped from stored responses, the stored body is already decoded
+SKIP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "set-cookie"}
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class HttpCache:
+    """
+    On-disk HTTP cache for GET requests made through a requests session.
+
+    Responses are stored with their ETag/Last-Modified validators and served from disk
+    while fresh, following Cache-Control/Expires or the `ttl` override. Once stale they
+    are revalidated with a conditional GET and a 304 is answered from disk.
+
+    Requests whose value for one of the `vary` headers or `vary_cookies` cookies differ
+    (e.g. another account's token or session cookie) never share an entry.
+    """
+
+    def __init__(self, name, ttl=None, vary=("authorization",), vary_cookies=(), max_entries=5000):
+        self.ttl = ttl
+        self.vary = tuple(x.lower() for x in vary)
+        self.vary_cookies = tuple(vary_cookies)
+        with _stores_lock:
+            self.store = _stores.get(name)
+            if self.store is None:
+                self.store = _stores[name] = CacheStore(
+                    CACHE_DIR / f"{name}.db",
+                    ttl=RETENTION,
+                    max_entries=max_entries,
+                    compress=True
+                )
+
+    def install(self, session, prefixes):
+        """Route GET requests to URLs starting with one of `prefixes` through the cache."""
+        prefixes = tuple(prefixes)
+        send = session.send
+
+        def cached_send(request, **kwargs):
+            if request.method != "GET" or kwargs.get("stream") or not request.url.startswith(prefixes):
+                return send(request, **kwargs)
+            return self.send(send, request, **kwargs)
+
+        session.send = cached_send
+        return session
+
+    def key(self, request):
+        vary = "\n".join(f"{x}:{request.headers.get(x, '')}" for x in self.vary)
+        if self.vary_cookies:
+            cookies = SimpleCookie()
+            cookies.load(request.headers.get("Cookie", ""))
+            vary += "".join(
+                f"\ncookie {x}:{cookies[x].value if x in cookies else ''}" for x in self.vary_cookies
+            )
+        return hashlib.sha256(f"{request.url}\n{vary}".encode()).hexdigest()
+
+    def send(self, send, request, **kwargs):
+        key = self.key(request)
+        entry = self.store.get(key)
+        bypass = "no-cache" in request.headers.get("cache-control", "").lower()
+
+        if entry and not bypass:
+            if time.time() < entry["fresh_until"]:
+                return self.build(entry, request, "hit")
+            if entry["etag"]:
+                request.headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                request.headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = send(request, **kwargs)
+
+        if response.status_code == 304 and entry:
+            entry["headers"].update(self.stored_headers(response.headers))
+            entry["fresh_until"] = time.time() + self.freshness(response.headers)
+            self.store.set(key, entry)
+            return self.build(entry, request, "revalidated")
+
+        if response.status_code == 200 and self.storable(response.headers):
+            self.store.set(key, {
+                "status": response.status_code,
+                "reason": response.reason,
+                "url": response.url,
+                "headers": self.stored_headers(response.headers),
+                "content": response.content,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "fresh_until": time.time() + self.freshness(response.headers),
+            })
+        response.from_cache = "miss"
+        return response
+
+    @staticmethod
+    def stored_headers(headers):
+        return {k: v for k, v in headers.items() if k.lower() not in SKIP_HEADERS}
+
+    @staticmethod
+    def storable(headers):
+        # "private" responses are fine to keep, this cache belongs to a single user
+        return "no-store" not in headers.get("Cache-Control", "").lower()
+
+    def freshness(self, headers):
+        if self.ttl is not None:
+            return self.ttl
+        cache_control = headers.get("Cache-Control", "").lower()
+        if "no-cache" in cache_control:
+            return 0
+        m = re.search(r"(?:s-maxage|max-age)=(\d+)", cache_control)
+        if m:
+            return max(0, int(m.group(1)) - int(headers.get("Age", 0) or 0))
+        if headers.get("Expires"):
+            try:
+                return max(0, parsedate_to_datetime(headers["Expires"]).timestamp() - time.time())
+            except (TypeError, ValueError):
+                return 0
+        return 0
+
+    @staticmethod
+    def build(entry, request, state):
+        response = Response()
+        response.status_code = entry["status"]
+        response.reason = entry["reason"]
+        response.url = entry["url"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = entry["content"]
+        response.request = request
+        response.elapsed = timedelta(0)
+        response.from_cache = state
+        return response
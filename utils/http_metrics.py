@@ -0,0 +1,204 @@
+import atexit
+import json
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+from urllib.parse import urlsplit
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf"))
+
+# Latency samples kept per endpoint for the percentiles, a uniform sample once exceeded
+MAX_SAMPLES = 1024
+
+ID_SEGMENT = re.compile(
+    r"^(?:\d+|[a-f0-9]{32}|[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}|"
+    r"(?=[A-Za-z0-9_-]*\d)[A-Za-z0-9_-]{16,})$",
+    re.IGNORECASE
+)
+
+
+def endpoint_template(method, url):
+    """`GET play.mercadolivre.com.br/api/vcp/{id}` style key, with IDs and query removed."""
+    parts = urlsplit(url)
+    path = "/".join("{id}" if ID_SEGMENT.match(x) else x for x in parts.path.split("/"))
+    return f"{method} {parts.hostname}{path}"
+
+
+class EndpointStats:
+    __slots__ = ("count", "errors", "bytes", "retries", "latency_sum", "latency_max", "buckets", "samples", "cache")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+        self.retries = 0
+        self.latency_sum = 0.0
+        self.latency_max = None
+        self.buckets = [0] * len(BUCKETS)
+        self.samples = []
+        self.cache = defaultdict(int)
+
+    def add_sample(self, elapsed):
+        # Reservoir sampling, so long-running processes keep a bounded, unbiased sample
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(elapsed)
+        else:
+            i = random.randrange(self.count)
+            if i < MAX_SAMPLES:
+                self.samples[i] = elapsed
+
+    def percentile(self, p):
+        if not self.samples:
+            return None
+        samples = sorted(self.samples)
+        return round(samples[min(len(samples) - 1, int(p / 100 * len(samples)))], 6)
+
+
+class HttpMetrics:
+    """
+    Per-endpoint HTTP metrics for the service sessions of a run: request counts, errors,
+    latency histograms, bytes transferred, retries and cache hit/miss/stale counts.
+
+    Set `VT_METRICS` to a file path to get a report when the run ends, as Prometheus text
+    when the path ends with `.prom` and as JSON otherwise. With `VT_METRICS_INTERVAL` set
+    to a number of seconds, the file is also rewritten that often while the process runs.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = defaultdict(EndpointStats)
+        self.caches = defaultdict(lambda: defaultdict(int))
+        self.report_path = os.environ.get("VT_METRICS")
+        self.interval = float(os.environ.get("VT_METRICS_INTERVAL") or 0)
+        self.registered = False
+
+    def install(self, session):
+        send = session.send
+
+        def measured_send(request, **kwargs):
+            start = time.perf_counter()
+            try:
+                response = send(request, **kwargs)
+            except Exception:
+                self.record(request.method, request.url, None, time.perf_counter() - start)
+                raise
+            size = 0 if kwargs.get("stream") else len(response.content or b"")
+            self.record(
+                request.method, request.url, response.status_code, time.perf_counter() - start, size,
+                retries=getattr(response, "retries", 0),
+                cache=getattr(response, "from_cache", None)
+            )
+            return response
+
+        session.send = measured_send
+        if self.report_path and not self.registered:
+            self.registered = True
+            atexit.register(self.write, self.report_path)
+            if self.interval > 0:
+                threading.Thread(target=self.write_periodically, daemon=True).start()
+        return session
+
+    def write_periodically(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.write(self.report_path)
+            except OSError:
+                pass
+
+    def record(self, method, url, status, elapsed, size=0, retries=0, cache=None):
+        with self.lock:
+            stats = self.endpoints[endpoint_template(method, url)]
+            stats.count += 1
+            stats.errors += status is None or status >= 400
+            stats.bytes += size
+            stats.retries += retries
+            stats.latency_sum += elapsed
+            stats.latency_max = elapsed if stats.latency_max is None else max(stats.latency_max, elapsed)
+            stats.buckets[bisect_left(BUCKETS, elapsed)] += 1
+            stats.add_sample(elapsed)
+            if cache:
+                stats.cache[cache] += 1
+
+    def cache(self, name, state):
+        """Count a hit, miss or stale read of a service-side cache, e.g. Meliplay's."""
+        with self.lock:
+            self.caches[name][state] += 1
+
+    def report(self):
+        with self.lock:
+            return {
+                "endpoints": {
+                    name: {
+                        "count": x.count,
+                        "errors": x.errors,
+                        "bytes": x.bytes,
+                        "retries": x.retries,
+                        "latency": {
+                            "sum": round(x.latency_sum, 6),
+                            "p50": x.percentile(50),
+                            "p95": x.percentile(95),
+                            "max": round(x.latency_max, 6) if x.latency_max is not None else None,
+                        },
+                        "cache": dict(x.cache),
+                    }
+                    for name, x in sorted(self.endpoints.items())
+                },
+                "caches": {name: dict(states) for name, states in sorted(self.caches.items())},
+            }
+
+    def prometheus(self):
+        lines = [
+            "# TYPE vt_http_requests_total counter",
+            "# TYPE vt_http_errors_total counter",
+            "# TYPE vt_http_bytes_total counter",
+            "# TYPE vt_http_retries_total counter",
+            "# TYPE vt_http_request_duration_seconds histogram",
+            "# TYPE vt_cache_lookups_total counter",
+        ]
+        with self.lock:
+            for name, x in sorted(self.endpoints.items()):
+                label = f'endpoint="{_escape(name)}"'
+                lines += [
+                    f"vt_http_requests_total{{{label}}} {x.count}",
+                    f"vt_http_errors_total{{{label}}} {x.errors}",
+                    f"vt_http_bytes_total{{{label}}} {x.bytes}",
+                    f"vt_http_retries_total{{{label}}} {x.retries}",
+                ]
+                total = 0
+                for bound, count in zip(BUCKETS, x.buckets):
+                    total += count
+                    le = "+Inf" if bound == float("inf") else bound
+                    lines.append(f'vt_http_request_duration_seconds_bucket{{{label},le="{le}"}} {total}')
+                lines += [
+                    f"vt_http_request_duration_seconds_sum{{{label}}} {x.latency_sum}",
+                    f"vt_http_request_duration_seconds_count{{{label}}} {x.count}",
+                ]
+                for state, count in sorted(x.cache.items()):
+                    lines.append(f'vt_cache_lookups_total{{cache="http",{label},state="{state}"}} {count}')
+            for name, states in sorted(self.caches.items()):
+                for state, count in sorted(states.items()):
+                    lines.append(f'vt_cache_lookups_total{{cache="{_escape(name)}",state="{state}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        text = self.prometheus() if path.suffix == ".prom" else json.dumps(self.report(), indent=2)
+        # Replaced in one step, so a scraper never reads a half-written report
+        temp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        temp.write_text(text, encoding="utf-8")
+        os.replace(temp, path)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+METRICS = HttpMetrics()
@@ -0,0 +1,77 @@
+import threading
+from datetime import timedelta
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import m3u8
+
+from vinetrimmer.utils.cache_store import CacheStore
+from vinetrimmer.utils.tracing import span
+
+CACHE_FILE = Path(__file__).resolve().parent.parent / "Cache" / "manifests.db"
+
+# Query parameters that change between requests for the same playlist (CDN tokens, expiry, signatures)
+VOLATILE_PARAMS = {
+    "token", "hdnts", "hdnea", "exp", "expires", "sig", "signature", "policy", "key-pair-id",
+    "acl", "hmac", "auth", "st", "ttl", "_", "ts",
+}
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def normalize_manifest_url(url):
+    """Drop volatile query parameters and sort the rest, so one playlist always gets one key."""
+    parts = urlsplit(url)
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in VOLATILE_PARAMS
+    )
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, urlencode(query), ""))
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CacheStore(CACHE_FILE, max_entries=2000)
+    return _store
+
+
+class ManifestFetcher:
+    """
+    Fetch HLS playlists through a service's session instead of `m3u8.load`, so they use
+    its pooled connections, cookies and headers.
+
+    Playlists are cached by their normalized URL: parsed in memory for the run and as
+    text on disk for `ttl` seconds, so repeated runs skip the request entirely.
+    """
+
+    def __init__(self, session, headers=None, ttl=300):
+        self.session = session
+        self.headers = headers
+        self.ttl = timedelta(seconds=ttl)
+        self._parsed = {}
+        self._lock = threading.Lock()
+
+    def load_m3u8(self, url):
+        key = normalize_manifest_url(url)
+        with self._lock:
+            playlist = self._parsed.get(key)
+        if playlist is not None:
+            return playlist
+
+        with span("manifest.fetch"):
+            text = get_store().get(key) if self.ttl else None
+            if text is None:
+                res = self.session.get(url, headers=self.headers)
+                res.raise_for_status()
+                text = res.text
+                if self.ttl:
+                    get_store().set(key, text, ttl=self.ttl)
+
+        with span("manifest.parse"):
+            playlist = m3u8.loads(text, uri=url)
+        with self._lock:
+            self._parsed[key] = playlist
+        return playlist
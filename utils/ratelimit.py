@@ -0,0 +1,172 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from requests.exceptions import ConnectionError, Timeout
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+THROTTLE_STATUS = {429, 503}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+_hosts = {}
+_hosts_lock = threading.Lock()
+
+
+class TokenBucket:
+    """Allow `rate` requests per second on average, with bursts of up to `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveLimit:
+    """
+    AIMD concurrency limit: grows by about one slot per round of successful requests and
+    is halved whenever the host throttles.
+    """
+
+    def __init__(self, max_concurrency):
+        self.max = max_concurrency
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+
+    def release(self, throttled=False):
+        with self.cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(self.max, self.limit + 1 / self.limit)
+            self.cond.notify_all()
+
+
+class HostLimiter:
+    def __init__(self, rate, burst, max_concurrency):
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = AdaptiveLimit(max_concurrency)
+
+    def acquire(self):
+        self.concurrency.acquire()
+        self.bucket.acquire()
+
+    def release(self, throttled=False):
+        self.concurrency.release(throttled)
+
+
+class RateLimiter:
+    """
+    Per-host rate limiting and retries for a requests session.
+
+    Every host gets a token bucket and an adaptive concurrency limit, shared by all
+    sessions of the process. Throttled (429/503), failed (5xx) and dropped requests are
+    retried with jittered exponential backoff, honoring `Retry-After`. Non-idempotent
+    requests are only retried when throttled (429/503), as the server didn't process them.
+    """
+
+    def __init__(self, rate=10, burst=20, max_concurrency=8, retries=5, backoff=0.5, max_backoff=60):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.local = threading.local()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(**(config or {}))
+
+    def host(self, host):
+        with _hosts_lock:
+            limiter = _hosts.get(host)
+            if limiter is None:
+                limiter = _hosts[host] = HostLimiter(self.rate, self.burst, self.max_concurrency)
+        return limiter
+
+    def install(self, session):
+        send = session.send
+
+        def limited_send(request, **kwargs):
+            # Redirects are followed by calling send() again from inside the first call,
+            # they must not wait for the slot their own request is holding
+            if getattr(self.local, "active", False):
+                return send(request, **kwargs)
+            self.local.active = True
+            try:
+                return self.send(send, request, **kwargs)
+            finally:
+                self.local.active = False
+
+        session.send = limited_send
+        return session
+
+    def send(self, send, request, **kwargs):
+        limiter = self.host(urlsplit(request.url).hostname)
+        idempotent = request.method in IDEMPOTENT_METHODS
+
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            limiter.acquire()
+            try:
+                response = send(request, **kwargs)
+            except (ConnectionError, Timeout):
+                limiter.release(throttled=True)
+                if last or not idempotent:
+                    raise
+                time.sleep(self.delay(attempt))
+                continue
+            except BaseException:
+                # Any other failure (redirect loops, broken bodies...) must still give the slot back
+                limiter.release()
+                raise
+
+            throttled = response.status_code in THROTTLE_STATUS
+            limiter.release(throttled)
+            retryable = response.status_code in RETRY_STATUS and (idempotent or throttled)
+            if last or not retryable:
+                response.retries = attempt
+                return response
+
+            delay = self.retry_after(response)
+            response.close()
+            time.sleep(self.delay(attempt) if delay is None else min(delay, self.max_backoff))
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    @staticmethod
+    def retry_after(response):
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        if value.strip().isdigit():
+            return int(value)
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
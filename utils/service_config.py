@@ -0,0 +1,68 @@
+import copy
+import os
+import pickle
+import threading
+from pathlib import Path
+
+import yaml
+
+from vinetrimmer.utils.tracing import span
+
+CONFIG_DIR = Path(__file__).resolve().parent.parent / "config" / "Services"
+COMPILED_DIR = Path(__file__).resolve().parent.parent / "Cache" / "config"
+
+_configs = {}
+_lock = threading.Lock()
+
+
+def load_service_config(name, compiled=True):
+    """
+    Load `config/Services/{name}.yml`, resolved relative to the package.
+
+    Parsed configs are memoized per process and invalidated when the file's mtime or
+    size changes. With `compiled`, the parsed result is also pickled under
+    `Cache/config`, so new processes skip YAML parsing until the file is edited.
+    Every call returns its own copy, so a service can't change another one's config.
+    """
+    with span("config.load"):
+        return _load_service_config(name, compiled)
+
+
+def _load_service_config(name, compiled):
+    path = CONFIG_DIR / f"{name}.yml"
+    stat = path.stat()
+    stamp = (stat.st_mtime_ns, stat.st_size)
+
+    with _lock:
+        cached = _configs.get(name)
+        if not cached or cached[0] != stamp:
+            config = _load_compiled(name, stamp) if compiled else None
+            if config is None:
+                with open(path, "r") as stream:
+                    config = yaml.safe_load(stream) or {}
+                if compiled:
+                    _save_compiled(name, stamp, config)
+            cached = _configs[name] = (stamp, config)
+
+    return copy.deepcopy(cached[1])
+
+
+def _load_compiled(name, stamp):
+    try:
+        with open(COMPILED_DIR / f"{name}.pickle", "rb") as f:
+            compiled_stamp, config = pickle.load(f)
+    except Exception:
+        return None
+    return config if compiled_stamp == stamp else None
+
+
+def _save_compiled(name, stamp, config):
+    target = COMPILED_DIR / f"{name}.pickle"
+    temp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    try:
+        COMPILED_DIR.mkdir(parents=True, exist_ok=True)
+        with open(temp, "wb") as f:
+            pickle.dump((stamp, config), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, target)
+    except OSError:
+        temp.unlink(missing_ok=True)
@@ -0,0 +1,27 @@
+from vinetrimmer.utils.cassette import CASSETTE
+from vinetrimmer.utils.http_cache import HttpCache
+from vinetrimmer.utils.http_metrics import METRICS
+from vinetrimmer.utils.ratelimit import RateLimiter
+
+
+def install_session_layers(session, name, config, cache_prefixes=(), **http_cache_kwargs):
+    """
+    Wrap a service session with the cassette, rate limiter, HTTP cache and metrics, in that order.
+
+    Each layer wraps the previous one, so the order matters: the cassette sees what goes
+    over the wire, retries are taken on behalf of the layers above, cache hits never take
+    a rate limit slot and the metrics see every request as the service made it.
+
+    GETs to URLs starting with one of `cache_prefixes` go through the HttpCache `name`,
+    set up from the `http_cache` section of `config` and `http_cache_kwargs`. It is
+    skipped while a cassette is in use, so recordings hold real responses.
+    """
+    CASSETTE.install(session)
+    RateLimiter.from_config(config.get("rate_limit")).install(session)
+
+    http_cache = config.get("http_cache") or {}
+    if cache_prefixes and http_cache.get("enabled", True) and not CASSETTE.enabled:
+        HttpCache(name, ttl=http_cache.get("ttl"), **http_cache_kwargs).install(session, cache_prefixes)
+
+    METRICS.install(session)
+    return session
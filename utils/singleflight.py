@@ -0,0 +1,36 @@
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Share one call between identical requests made at the same time.
+
+    The first `do()` for a key runs the function and concurrent callers with the same
+    key wait for its result. The key is dropped as soon as the call returns or fails, so
+    results aren't kept alive and later callers run the function again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            owner = future is None
+            if owner:
+                future = self._calls[key] = Future()
+
+        if owner:
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+            future.set_result(result)
+
+        return future.result()
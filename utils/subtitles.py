@@ -0,0 +1,152 @@
+import codecs
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from requests import RequestException
+
+from vinetrimmer.utils.cache_store import CacheStore
+from vinetrimmer.utils.manifests import normalize_manifest_url
+
+CACHE_DIR = Path(__file__).resolve().parent.parent / "Cache" / "subtitles"
+
+CHUNK_SIZE = 64 * 1024
+TIMESTAMP = re.compile(r"^((?:\d+:)?\d{2}:\d{2})[.,](\d{3})\s+-->\s+((?:\d+:)?\d{2}:\d{2})[.,](\d{3})(.*)$")
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def normalize_vtt(chunks):
+    """
+    Normalize a WebVTT file chunk by chunk: strip the BOM, use LF line endings and a
+    WEBVTT header, fix `,` decimal separators in timings, trim trailing spaces and
+    collapse runs of blank lines. Yields text as lines complete, never the whole file.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    state = {"first": True, "blank": False}
+
+    def lines(text):
+        for line in text.split("\n"):
+            line = line.rstrip()
+            if state["first"]:
+                state["first"] = False
+                line = line.lstrip("\ufeff")
+                if not line.startswith("WEBVTT"):
+                    yield "WEBVTT\n\n"
+                    state["blank"] = True
+                    if not line:
+                        continue
+            if not line:
+                if not state["blank"]:
+                    state["blank"] = True
+                    yield "\n"
+                continue
+            state["blank"] = False
+            m = TIMESTAMP.match(line)
+            if m:
+                line = f"{m.group(1)}.{m.group(2)} --> {m.group(3)}.{m.group(4)}{m.group(5)}"
+            yield line + "\n"
+
+    def newlines(text):
+        return text.replace("\r\n", "\n").replace("\r", "\n")
+
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        # A trailing \r may be the first half of a \r\n split across chunks, keep it for the next one
+        cut = len(pending) - 1 if pending.endswith("\r") else len(pending)
+        head, sep, rest = newlines(pending[:cut]).rpartition("\n")
+        if sep:
+            pending = rest + pending[cut:]
+            yield "".join(lines(head))
+    pending = newlines(pending + decoder.decode(b"", final=True))
+    if pending.endswith("\n"):
+        pending = pending[:-1]
+    if pending:
+        yield "".join(lines(pending))
+
+
+def get_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = CacheStore(CACHE_DIR / "index.db", max_entries=50000)
+    return _index
+
+
+class SubtitleCache:
+    """
+    Content-addressed on-disk subtitle cache, shared by every title and run.
+
+    Files are stored once per hash of their normalized content, and each URL remembers
+    its file and validators, so later runs only make a conditional GET. Subtitles are
+    fetched in the background with `prefetch`; `get` waits for them.
+    """
+
+    def __init__(self, session, headers=None, workers=8):
+        self.session = session
+        self.headers = headers
+        self.blobs = CACHE_DIR / "blobs"
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.futures = {}
+        self.lock = threading.Lock()
+
+    def prefetch(self, urls):
+        with self.lock:
+            for url in urls:
+                if url not in self.futures:
+                    self.futures[url] = self.pool.submit(self.fetch, url)
+
+    def get(self, url):
+        """Path of the cached copy of `url`, or None if it couldn't be fetched."""
+        self.prefetch([url])
+        try:
+            return self.futures[url].result()
+        except (RequestException, OSError):
+            return None
+
+    def fetch(self, url):
+        key = normalize_manifest_url(url)
+        entry = get_index().get(key)
+        headers = dict(self.headers or {})
+        if entry and (self.blobs / entry["file"]).exists():
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        with self.session.get(url, headers=headers, stream=True) as res:
+            if res.status_code == 304 and entry:
+                return self.blobs / entry["file"]
+            res.raise_for_status()
+            path = self.store(res.iter_content(CHUNK_SIZE))
+            get_index().set(key, {
+                "file": path.name,
+                "etag": res.headers.get("ETag"),
+                "last_modified": res.headers.get("Last-Modified"),
+            })
+        return path
+
+    def store(self, chunks):
+        self.blobs.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        temp = self.blobs / f"{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp, "wb") as f:
+                for text in normalize_vtt(chunks):
+                    data = text.encode("utf-8")
+                    digest.update(data)
+                    f.write(data)
+            path = self.blobs / f"{digest.hexdigest()}.vtt"
+            if path.exists():
+                temp.unlink()
+            else:
+                os.replace(temp, path)
+        except OSError:
+            temp.unlink(missing_ok=True)
+            raise
+        return path
@@ -0,0 +1,197 @@
+"""
+Phase-level tracing for service runs.
+
+Wrap a phase with `span("name")` (or decorate a function with `traced("name")`) and set
+`VT_TRACE` to a file path to get the wall time of every nested phase at the end of the
+run, in the collapsed-stack format read by flamegraph.pl, speedscope and inferno.
+
+Set `VT_PROFILE` to a span name to also profile that phase, with `VT_PROFILE_MODE` being
+`sampling` (default, writes collapsed stacks) or `deterministic` (cProfile, writes pstats).
+One profiler covers every call of the span in the process, from any thread, and its
+output is written when the run ends to `VT_PROFILE_OUT`, or to `<span name>.folded`/
+`.pstats` by default.
+
+When none of these are set, spans cost a dict lookup.
+"""
+import atexit
+import cProfile
+import functools
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+TRACE_PATH = os.environ.get("VT_TRACE")
+PROFILE_SPAN = os.environ.get("VT_PROFILE")
+PROFILE_MODE = os.environ.get("VT_PROFILE_MODE", "sampling")
+PROFILE_OUT = os.environ.get("VT_PROFILE_OUT")
+
+SAMPLE_INTERVAL = 0.005
+
+
+class Tracer:
+    def __init__(self, path=None, profile=None):
+        self.path = path
+        self.profile = profile
+        self.enabled = bool(path or profile)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.self_time = defaultdict(float)
+        self.profiler = None
+        if path:
+            atexit.register(self.write, path)
+
+    def stack(self):
+        if not hasattr(self.local, "stack"):
+            # Worker threads are folded together under one root frame
+            name = threading.current_thread().name
+            root = "MainThread" if name == "MainThread" else "worker"
+            self.local.stack = [[root, 0.0]]
+        return self.local.stack
+
+    @contextmanager
+    def span(self, name):
+        stack = self.stack()
+        frame = [name, 0.0]
+        stack.append(frame)
+        profiler = self.get_profiler(name) if name == self.profile else nullcontext()
+        start = time.perf_counter()
+        try:
+            with profiler:
+                yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            stack[-1][1] += elapsed
+            path = ";".join(x[0] for x in stack + [frame])
+            with self.lock:
+                self.self_time[path] += max(0.0, elapsed - frame[1])
+
+    def get_profiler(self, name):
+        # Only one profiler can be active per process, it's shared by every call of the span
+        with self.lock:
+            if self.profiler is None:
+                if PROFILE_MODE == "deterministic":
+                    self.profiler = DeterministicProfiler(PROFILE_OUT or f"{name}.pstats")
+                else:
+                    self.profiler = SamplingProfiler(PROFILE_OUT or f"{name}.folded")
+            return self.profiler
+
+    def collapsed(self):
+        with self.lock:
+            return "".join(
+                f"{path} {int(seconds * 1_000_000)}\n"
+                for path, seconds in sorted(self.self_time.items()) if seconds > 0
+            )
+
+    def write(self, path):
+        Path(path).write_text(self.collapsed(), encoding="utf-8")
+
+
+class DeterministicProfiler:
+    """
+    cProfile, enabled while at least one thread is inside the span. The profile keeps
+    adding up across calls and is written when the process exits.
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.profile = cProfile.Profile()
+        self.depth = 0
+        self.lock = threading.Lock()
+        atexit.register(self.write)
+
+    def __enter__(self):
+        with self.lock:
+            if not self.depth:
+                self.profile.enable()
+            self.depth += 1
+
+    def __exit__(self, *_):
+        with self.lock:
+            self.depth -= 1
+            if not self.depth:
+                self.profile.disable()
+
+    def write(self):
+        with self.lock:
+            self.profile.dump_stats(self.out)
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of the threads inside the span every few milliseconds. The
+    sampler thread only runs while one of them is, samples add up across calls and are
+    written when the process exits.
+    """
+
+    def __init__(self, out, interval=SAMPLE_INTERVAL):
+        self.out = out
+        self.interval = interval
+        self.samples = defaultdict(int)
+        # Span depth per thread inside it
+        self.threads = defaultdict(int)
+        self.sampler = None
+        self.lock = threading.Lock()
+        atexit.register(self.write)
+
+    def __enter__(self):
+        with self.lock:
+            self.threads[threading.get_ident()] += 1
+            if self.sampler is None:
+                self.sampler = threading.Thread(target=self.run, name="SamplingProfiler", daemon=True)
+                self.sampler.start()
+
+    def __exit__(self, *_):
+        with self.lock:
+            thread_id = threading.get_ident()
+            self.threads[thread_id] -= 1
+            if not self.threads[thread_id]:
+                del self.threads[thread_id]
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                if not self.threads:
+                    self.sampler = None
+                    return
+                thread_ids = list(self.threads)
+            frames = sys._current_frames()
+            for thread_id in thread_ids:
+                stack = []
+                frame = frames.get(thread_id)
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if stack:
+                    with self.lock:
+                        self.samples[";".join(reversed(stack))] += 1
+
+    def write(self):
+        with self.lock:
+            text = "".join(f"{stack} {count}\n" for stack, count in sorted(self.samples.items()))
+        Path(self.out).write_text(text, encoding="utf-8")
+
+
+TRACER = Tracer(TRACE_PATH, PROFILE_SPAN)
+
+
+def span(name):
+    if not TRACER.enabled:
+        return nullcontext()
+    return TRACER.span(name)
+
+
+def traced(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,154 @@
+import copy
+
+from langcodes import Language
+from m3u8.model import MediaList, PlaylistList
+
+AUDIO_CODEC_MAP = {
+    "AAC": "mp4a",
+    "AC3": "ac-3",
+    "EC3": "ec-3"
+}
+
+VIDEO_CODEC_MAP = {
+    "H264": ("avc1", "avc3"),
+    "H265": ("hvc1", "hev1", "dvh1", "dvhe"),
+    "VP9": ("vp09", "vp9"),
+    "AV1": ("av01",),
+}
+
+# HLS VIDEO-RANGE values per --range, Dolby Vision is matched by codec instead
+VIDEO_RANGE_MAP = {
+    "SDR": ("SDR",),
+    "HDR": ("PQ",),
+    "HDR10": ("PQ",),
+    "HLG": ("HLG",),
+}
+DOLBY_VISION_CODECS = ("dvh1", "dvhe")
+
+# --alang/--slang values that aren't a language, no pruning is done for them
+LANGUAGE_KEYWORDS = {"all", "orig", "best"}
+
+
+def primary_language(tag):
+    try:
+        return Language.get(tag).language
+    except (ValueError, LookupError, AttributeError):
+        return str(tag).split("-")[0].lower()
+
+
+def keep(items, predicate):
+    """Items matching `predicate`, or all of them if none does, so pruning never leaves nothing to pick from."""
+    kept = [x for x in items if predicate(x)]
+    return kept if kept else list(items)
+
+
+class TrackSelection:
+    """
+    The track choices of a `vt dl` call (codecs, quality, range and languages), applied
+    to the manifest before it's turned into Tracks, so renditions that can't be picked
+    are never built.
+
+    Pruning is conservative: a predicate is skipped when it would remove every
+    rendition of a kind, and languages are left alone for `all`/`orig`/`best`, so the
+    final selection made by vinetrimmer always sees what it would have picked.
+    """
+
+    def __init__(self, vcodec=None, acodec=None, quality=None, range_=None, alang=None, slang=None):
+        self.vcodec = vcodec
+        self.acodec = acodec
+        self.quality = quality
+        self.range = range_
+        self.alang = self.languages(alang)
+        self.slang = self.languages(slang)
+
+    @classmethod
+    def from_context(cls, ctx, **overrides):
+        params = ctx.parent.params
+        kwargs = {
+            "vcodec": params.get("vcodec"),
+            "acodec": params.get("acodec"),
+            "quality": params.get("quality"),
+            "range_": params.get("range_"),
+            "alang": params.get("alang"),
+            "slang": params.get("slang"),
+        }
+        kwargs.update(overrides)
+        return cls(**kwargs)
+
+    @staticmethod
+    def languages(values):
+        values = [values] if isinstance(values, str) else list(values or [])
+        if not values or any(str(x).lower() in LANGUAGE_KEYWORDS for x in values):
+            return None
+        return {primary_language(x) for x in values}
+
+    def prune_m3u8(self, playlist):
+        """Copy of a master playlist without the variants and renditions that can't be selected."""
+        if not playlist.is_variant:
+            return playlist
+
+        variants = list(playlist.playlists)
+        if self.vcodec in VIDEO_CODEC_MAP:
+            variants = keep(variants, lambda x: self.video_codec(x).startswith(VIDEO_CODEC_MAP[self.vcodec]))
+        if self.range == "DV":
+            variants = keep(variants, lambda x: self.video_codec(x).startswith(DOLBY_VISION_CODECS))
+        elif self.range in VIDEO_RANGE_MAP:
+            variants = keep(
+                variants,
+                lambda x: (getattr(x.stream_info, "video_range", None) or "SDR") in VIDEO_RANGE_MAP[self.range]
+            )
+        if self.quality:
+            variants = keep(variants, lambda x: self.matches_quality(x.stream_info.resolution))
+
+        # Audio codecs are only known through the variants that use each group
+        group_codecs = {}
+        for variant in playlist.playlists:
+            if variant.stream_info.audio:
+                group_codecs.setdefault(variant.stream_info.audio, set()).update(
+                    x.strip() for x in (variant.stream_info.codecs or "").split(",")
+                )
+
+        audios = [x for x in playlist.media if x.type == "AUDIO"]
+        subtitles = [x for x in playlist.media if x.type == "SUBTITLES"]
+        others = [x for x in playlist.media if x.type not in ("AUDIO", "SUBTITLES")]
+        if self.acodec in AUDIO_CODEC_MAP:
+            codec = AUDIO_CODEC_MAP[self.acodec]
+            audios = keep(audios, lambda x: any(c.startswith(codec) for c in group_codecs.get(x.group_id, ())))
+        if self.alang:
+            audios = keep(audios, lambda x: not x.language or primary_language(x.language) in self.alang)
+        if self.slang:
+            subtitles = keep(subtitles, lambda x: not x.language or primary_language(x.language) in self.slang)
+
+        pruned = copy.copy(playlist)
+        pruned.playlists = PlaylistList(variants)
+        pruned.media = MediaList(audios + subtitles + others)
+        return pruned
+
+    def matches_quality(self, resolution):
+        """Same test as vinetrimmer's -q filter: the height, or the 16:9 height of the width, equals it."""
+        if not resolution:
+            return False
+        width, height = resolution
+        return height == self.quality or int(width * (9 / 16)) == self.quality
+
+    @staticmethod
+    def video_codec(variant):
+        return next(
+            (x.strip() for x in (variant.stream_info.codecs or "").split(",")
+             if not x.strip().startswith(("mp4a", "ac-3", "ec-3", "opus", "flac"))),
+            ""
+        )
+
+    def subtitles(self, items, language):
+        """Subtitle entries from a service API whose `language(item)` matches --slang."""
+        if not self.slang:
+            return list(items)
+        return keep(items, lambda x: primary_language(language(x)) in self.slang)
+
+    def filter_tracks(self, tracks):
+        """Drop audio tracks in another codec than --acodec from already built Tracks."""
+        if self.acodec in AUDIO_CODEC_MAP:
+            tracks.audios = [
+                x for x in tracks.audios if (x.codec or "").split("-")[0] in AUDIO_CODEC_MAP[self.acodec]
+            ]
+        return tracks